@@ -1,10 +1,12 @@
 # %%
 import geopandas as gpd
-from shapely import wkt
 import pandas as pd
 import matplotlib.pyplot as plt
 import mapclassify
 
+import maps
+import results_store
+
 
 # %%
 
@@ -13,11 +15,15 @@ policy_list = ["pre_FIRM", "voucher"]
 
 
 def plot_subplots(policy_name, census_tract_number):
-    result_df = pd.read_csv(
-        "data/result_{}_{}.csv".format(policy_name, census_tract_number)
+    result_df = results_store.read_scenario(
+        policy_name,
+        census_tract_number,
+        columns=["EAD", "insurance_type", "insurance_coverage", "elevation"],
+        structure_columns=["x", "y"],
+    )
+    structures_gdf = gpd.GeoDataFrame(
+        result_df, geometry=gpd.points_from_xy(result_df["x"], result_df["y"]), crs="EPSG:4326"
     )
-    result_df["geometry"] = result_df["geometry"].apply(wkt.loads)
-    structures_gdf = gpd.GeoDataFrame(result_df, geometry="geometry", crs="EPSG:4326")
 
     fig, axes = plt.subplots(2, 2, figsize=(15, 10))
     fig.suptitle("Simulation_Result_{}_{}".format(policy_name, census_tract_number))
@@ -75,74 +81,11 @@ def plot_subplots(policy_name, census_tract_number):
     )
 
 
-plot_subplots("voucher", 0)
-
 # %%
+# render_all uses a process pool, whose workers re-import this script on spawn platforms
+if __name__ == "__main__":
+    plot_subplots("voucher", 0)
 
-for census_tract_number in census_tract_number_list:
-    for policy_name in policy_list:
-        plot_subplots(policy_name, census_tract_number)
-
-# %%
-for census_tract_number in census_tract_number_list:
-    for policy_name in policy_list:
-        result_df = pd.read_csv(
-            "data/result_{}_{}.csv".format(policy_name, census_tract_number)
-        )
-        if census_tract_number_list.index(census_tract_number) > 0:
-            previous_census_tract_number = census_tract_number_list[
-                census_tract_number_list.index(census_tract_number) - 1
-            ]
-
-            previous_result_df = pd.read_csv(
-                "data/result_{}.csv".format(previous_census_tract_number)
-            )
-            previous_result_df["geometry"] = previous_result_df["geometry"].apply(
-                wkt.loads
-            )
-            previous_structures_gdf = gpd.GeoDataFrame(
-                previous_result_df, geometry="geometry", crs="EPSG:4326"
-            )
-
-            result_df["geometry"] = result_df["geometry"].apply(wkt.loads)
-            structures_gdf = gpd.GeoDataFrame(
-                result_df, geometry="geometry", crs="EPSG:4326"
-            )
-
-            # Merge current and previous GeoDataFrames on geometry
-            merged_gdf = structures_gdf.merge(
-                previous_structures_gdf[["geometry", "EAD"]],
-                on="geometry",
-                suffixes=("", "_previous"),
-            )
-
-            # Calculate the difference in EAD
-            merged_gdf["EAD_difference"] = (
-                merged_gdf["EAD_previous"] - merged_gdf["EAD"]
-            )
-
-            # Plot the difference
-            ax = merged_gdf.plot(
-                column="EAD_difference",
-                legend=True,
-                aspect=1,
-                cmap="viridis_r",
-                markersize=5,
-            )
-
-            # Add title to the figure
-            plt.title(
-                "EAD Difference Census Tract: {} vs {}".format(
-                    census_tract_number, previous_census_tract_number
-                )
-            )
-
-            plt.show()
-    # result_df = result_df.head(100)
-    # result_df = result_df[result_df["EAD"] < 10000]
-
-    # Determine the groups using quantiles
-
-    # Plot the locations on the map with color based on the determined groups
-
-    # Add title to the figure
+    # all scenarios and the EAD differences between consecutive census tract numbers,
+    # rasterized onto one grid and rendered in parallel
+    maps.render_all(policy_list, census_tract_number_list, output_directory="plots")
@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+
+import collection
+import results_store
+import synthetic
+from model import adaptation_simulation
+
+# Times the stages of one scenario on synthetic populations of several sizes:
+# agent_generation, step (without data collection), data collection (model reporters,
+# a collection.array_collector and the population results frame) and writing the
+# scenario output. Results are saved as JSON; compare_to_baseline flags every stage that
+# got slower than a saved baseline by more than the tolerance. compare_option_search
+# times the pruned option search against the exhaustive one on a fine elevation grid.
+
+return_period_list = [5.886, 13.734, 24.7212, 61.803, 200]
+stages = ["agent_generation", "step", "collect", "write"]
+
+
+def time_scenario(structure_dataframe, policy, n_steps=1, output_directory=None):
+    timings = dict.fromkeys(stages, 0.0)
+
+    start = time.perf_counter()
+    simulation_model = adaptation_simulation(
+        structure_dataframe=structure_dataframe.copy(),
+        return_period_list=return_period_list,
+        policy=policy,
+        CRS_rewards=0.25,
+        covered_census_tracts=10,
+        risk_reduction_percentage=0.25,
+        agent_views=False,
+        # without agent views the Mesa reporters only see the model, the per-household
+        # variables are collected into typed arrays
+        collector=collection.array_collector(n_steps=n_steps),
+    )
+    simulation_model.agent_generation()
+    timings["agent_generation"] = time.perf_counter() - start
+
+    def timed(collect):
+        def timed_collect(model):
+            collect_start = time.perf_counter()
+            collect(model)
+            timings["collect"] += time.perf_counter() - collect_start
+
+        return timed_collect
+
+    simulation_model.datacollector.collect = timed(simulation_model.datacollector.collect)
+    simulation_model.collector.collect = timed(simulation_model.collector.collect)
+    for _ in range(n_steps):
+        start = time.perf_counter()
+        simulation_model.step()
+        timings["step"] += time.perf_counter() - start
+    timings["step"] -= timings["collect"]
+
+    # the per-household results frame of the scenario output is collection too
+    start = time.perf_counter()
+    results_frame = simulation_model.population.results_frame(simulation_model.schedule.steps)
+    timings["collect"] += time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory(dir=output_directory) as directory:
+        start = time.perf_counter()
+        results_store.write_scenario(
+            results_frame,
+            policy,
+            simulation_model.covered_census_tracts,
+            directory,
+            simulation_model.CRS_rewards,
+            simulation_model.risk_reduction_percentage,
+        )
+        timings["write"] = time.perf_counter() - start
+    return timings
+
+
+def compare_option_search(structure_dataframe, elevation_step=0.5, max_elevation=8, repeat=3):
+    # exhaustive against pruned search for pre_FIRM on a fine elevation grid: fastest
+    # decision pass of each, options evaluated, and households whose choice differs
+    elevation_options = list(np.arange(0, max_elevation + elevation_step / 2, elevation_step))
+    searches = {}
+    for option_search in ["exhaustive", "pruned"]:
+        simulation_model = adaptation_simulation(
+            structure_dataframe=structure_dataframe.copy(),
+            return_period_list=return_period_list,
+            policy="pre_FIRM",
+            CRS_rewards=0.25,
+            covered_census_tracts=10,
+            risk_reduction_percentage=0.25,
+            agent_views=False,
+        )
+        simulation_model.elevation_options = elevation_options
+        simulation_model.option_search = option_search
+        simulation_model.agent_generation()
+        seconds = []
+        for _ in range(repeat):
+            simulation_model.reset_decisions()
+            start = time.perf_counter()
+            simulation_model.decide()
+            seconds.append(time.perf_counter() - start)
+        columns = simulation_model.population.columns
+        searches[option_search] = {
+            "seconds": min(seconds),
+            "evaluated_options": int(columns["evaluated_options"].sum()),
+            "choice": np.column_stack([
+                np.nan_to_num(columns["elevation"], nan=-1),
+                columns["insurance_type"],
+                columns["insurance_coverage"],
+            ]),
+        }
+    exhaustive, pruned = searches["exhaustive"], searches["pruned"]
+    return {
+        "n_structures": len(structure_dataframe),
+        "elevation_step": elevation_step,
+        "n_elevations": len(elevation_options),
+        "exhaustive_seconds": exhaustive["seconds"],
+        "pruned_seconds": pruned["seconds"],
+        "speedup": exhaustive["seconds"] / max(pruned["seconds"], 1e-12),
+        "exhaustive_evaluated_options": exhaustive["evaluated_options"],
+        "pruned_evaluated_options": pruned["evaluated_options"],
+        "differing_choices": int((exhaustive["choice"] != pruned["choice"]).any(axis=1).sum()),
+    }
+
+
+def run_benchmark(
+        sizes=(1000, 10000, 100000),
+        policies=("pre_FIRM", "voucher"),
+        repeat=3,
+        n_steps=1,
+        seed=0,
+        option_search_sizes=(),
+):
+    # the fastest of repeat runs per stage, which is the least noisy estimate
+    cases = []
+    for n_structures in sizes:
+        structure_dataframe = synthetic.generate_structures(n_structures, seed)
+        for policy in policies:
+            runs = [
+                time_scenario(structure_dataframe, policy, n_steps) for _ in range(repeat)
+            ]
+            timings = {stage: min(run[stage] for run in runs) for stage in stages}
+            cases.append({
+                "n_structures": n_structures,
+                "policy": policy,
+                "seconds": timings,
+                "structures_per_second": n_structures / max(sum(timings.values()), 1e-12),
+            })
+    option_search = [
+        compare_option_search(synthetic.generate_structures(n_structures, seed), repeat=repeat)
+        for n_structures in option_search_sizes
+    ]
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "n_steps": n_steps,
+        "seed": seed,
+        "cases": cases,
+        "option_search": option_search,
+    }
+
+
+def save_results(results, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+
+
+def load_results(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25, minimum_seconds=0.01):
+    # stages slower than baseline * (1 + tolerance); stages faster than minimum_seconds
+    # in the baseline are too noisy to compare
+    baseline_cases = {
+        (case["n_structures"], case["policy"]): case["seconds"] for case in baseline["cases"]
+    }
+    regressions = []
+    for case in results["cases"]:
+        baseline_seconds = baseline_cases.get((case["n_structures"], case["policy"]))
+        if baseline_seconds is None:
+            continue
+        for stage, seconds in case["seconds"].items():
+            reference = baseline_seconds.get(stage)
+            if reference is None or reference < minimum_seconds:
+                continue
+            if seconds > reference * (1 + tolerance):
+                regressions.append({
+                    "n_structures": case["n_structures"],
+                    "policy": case["policy"],
+                    "stage": stage,
+                    "seconds": seconds,
+                    "baseline_seconds": reference,
+                    "ratio": seconds / reference,
+                })
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--policies", nargs="+", default=["pre_FIRM", "voucher"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=1)
+    parser.add_argument("--output", default="data/benchmarks/latest.json")
+    parser.add_argument("--baseline", default="data/benchmarks/baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    # pruned against exhaustive search on a 0.5 ft elevation grid at these sizes
+    parser.add_argument("--option-search-sizes", type=int, nargs="*", default=[10000])
+    arguments = parser.parse_args()
+
+    results = run_benchmark(
+        arguments.sizes,
+        arguments.policies,
+        arguments.repeat,
+        arguments.steps,
+        option_search_sizes=arguments.option_search_sizes,
+    )
+    save_results(results, arguments.output)
+    for case in results["cases"]:
+        print(case["n_structures"], case["policy"], {
+            stage: round(seconds, 4) for stage, seconds in case["seconds"].items()
+        })
+    for case in results["option_search"]:
+        print("option search", case)
+        if case["differing_choices"]:
+            raise SystemExit("pruned search chose differently for {} households".format(case["differing_choices"]))
+
+    if arguments.save_baseline:
+        save_results(results, arguments.baseline)
+    elif os.path.exists(arguments.baseline):
+        regressions = compare_to_baseline(results, load_results(arguments.baseline), arguments.tolerance)
+        for regression in regressions:
+            print("regression", regression)
+        if regressions:
+            raise SystemExit(1)
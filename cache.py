@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import shutil
+from ast import literal_eval
+
+import numpy as np
+import pandas as pd
+
+cache_version = 1
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_digest(source_path, cache_dir="data/cache", rehash=False):
+    # sha256 of the source file, hashed again only when its size or modification time
+    # changed since the last call (or with rehash=True); the digests are kept in
+    # <cache_dir>/<name>.source.json
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    index_path = os.path.join(cache_dir, "{}.source.json".format(stem))
+    status = os.stat(source_path)
+    key = {
+        "source": os.path.abspath(source_path),
+        "size": status.st_size,
+        "mtime_ns": status.st_mtime_ns,
+    }
+    if not rehash and os.path.exists(index_path):
+        with open(index_path) as index_file:
+            index = json.load(index_file)
+        if all(index.get(name) == value for name, value in key.items()):
+            return index["sha256"]
+
+    key["sha256"] = file_hash(source_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary_path = index_path + ".tmp-{}".format(os.getpid())
+    with open(temporary_path, "w") as index_file:
+        json.dump(key, index_file, indent=2)
+    os.replace(temporary_path, index_path)
+    return key["sha256"]
+
+
+def cache_path(source_path, cache_dir="data/cache", digest=None):
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    if digest is None:
+        digest = source_digest(source_path, cache_dir)
+    return os.path.join(cache_dir, "{}-v{}-{}".format(stem, cache_version, digest[:16]))
+
+
+def build_cache(source_path, cache_dir="data/cache", rehash=False):
+    # One-time ingest of a structure CSV: flood_elevation_list becomes a dense float
+    # matrix, text columns become integer codes plus a categories array, and every
+    # array is written as .npy so later runs can memory-map it.
+    digest = source_digest(source_path, cache_dir, rehash)
+    path = cache_path(source_path, cache_dir, digest)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return path
+
+    structure_dataframe = pd.read_csv(source_path, header=0)
+    temporary_path = path + ".tmp-{}".format(os.getpid())
+    os.makedirs(temporary_path, exist_ok=True)
+
+    columns = []
+    for name in structure_dataframe.columns:
+        column = structure_dataframe[name]
+        if name == "flood_elevation_list":
+            flood_elevations = np.array(
+                [literal_eval(flood_elevation_list) for flood_elevation_list in column],
+                dtype=float,
+            )
+            np.save(os.path.join(temporary_path, "flood_elevations.npy"), flood_elevations)
+        if pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+            np.save(os.path.join(temporary_path, "{}.npy".format(name)), column.to_numpy())
+            columns.append({"name": name, "kind": "numeric"})
+        else:
+            codes, categories = pd.factorize(column)
+            np.save(
+                os.path.join(temporary_path, "{}.npy".format(name)),
+                codes.astype(np.int32),
+            )
+            np.save(
+                os.path.join(temporary_path, "{}.categories.npy".format(name)),
+                np.asarray(categories, dtype=str),
+            )
+            columns.append({"name": name, "kind": "categorical"})
+
+    with open(os.path.join(temporary_path, "meta.json"), "w") as meta_file:
+        json.dump(
+            {
+                "source": os.path.abspath(source_path),
+                "sha256": digest,
+                "version": cache_version,
+                "n_rows": len(structure_dataframe),
+                "columns": columns,
+            },
+            meta_file,
+            indent=2,
+        )
+
+    try:
+        os.rename(temporary_path, path)
+    except OSError:
+        # another process finished the same cache first
+        shutil.rmtree(temporary_path, ignore_errors=True)
+    return path
+
+
+def load_cache(path, mmap_mode="r"):
+    with open(os.path.join(path, "meta.json")) as meta_file:
+        meta = json.load(meta_file)
+
+    data = {}
+    flood_elevations = None
+    if os.path.exists(os.path.join(path, "flood_elevations.npy")):
+        flood_elevations = np.load(
+            os.path.join(path, "flood_elevations.npy"), mmap_mode=mmap_mode
+        )
+    for column in meta["columns"]:
+        name = column["name"]
+        if column["kind"] == "numeric":
+            data[name] = np.load(os.path.join(path, "{}.npy".format(name)), mmap_mode=mmap_mode)
+        else:
+            codes = np.load(os.path.join(path, "{}.npy".format(name)), mmap_mode=mmap_mode)
+            categories = np.load(os.path.join(path, "{}.categories.npy".format(name)))
+            # -1 codes are missing values
+            data[name] = pd.Categorical.from_codes(codes, categories.astype(object))
+
+    # the numeric columns stay backed by the memory-mapped files
+    return pd.DataFrame(data, copy=False), flood_elevations
+
+
+def load_structures(source_path, cache_dir="data/cache", mmap_mode="r", rehash=False):
+    # (structure_dataframe, flood_elevations) for a structure CSV, building the cache on
+    # first use; rehash=True hashes the source even if its size and mtime are unchanged
+    return load_cache(build_cache(source_path, cache_dir, rehash), mmap_mode)
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+import vectorized
+
+# Data collection for large runs. Instead of Mesa agent reporters (one Python object
+# per agent and step, damage as Python lists), every collect copies the selected
+# population columns into preallocated typed arrays: (T, N) per reporter and (T, N, R)
+# for damage, or with aggregate only per-group sums, e.g. per census tract. Pass an
+# array_collector to adaptation_simulation(collector=...).
+
+reporter_dtypes = {
+    "EAD": np.float32,
+    "insurance_type": np.uint8,
+    "insurance_coverage": np.float32,
+    "elevation": np.float32,
+    "damage": np.float32,
+    "public_risk_reduction": np.float32,
+    "risk_perception": np.float32,
+    "EAD_no_action": np.float32,
+}
+default_reporters = ["EAD", "insurance_type", "insurance_coverage", "elevation", "damage"]
+n_insurance_types = len(vectorized.insurance_types)
+
+
+class array_collector:
+    def __init__(self, reporters=default_reporters, aggregate=None, n_steps=1):
+        # aggregate: structure_dataframe column to sum over (e.g. 'GEOID'), None keeps
+        # every agent; n_steps is the initial capacity, doubled when exceeded
+        unknown = [name for name in reporters if name not in reporter_dtypes]
+        if unknown:
+            raise ValueError("unknown reporters {}, choose from {}".format(unknown, list(reporter_dtypes)))
+        self.reporters = list(reporters)
+        self.aggregate = aggregate
+        self.capacity = n_steps
+        self.steps = []
+        self.data = None
+        self.groups = None
+        self.group_codes = None
+        self.households = None
+        self.unique_id = None
+
+    def allocate(self, model):
+        columns = model.population.columns
+        self.unique_id = model.population.unique_id
+        if self.aggregate is not None:
+            self.group_codes, self.groups = pd.factorize(
+                model.structure_dataframe[self.aggregate], use_na_sentinel=False
+            )
+            self.households = np.bincount(self.group_codes, minlength=len(self.groups))
+        width = len(self.unique_id) if self.aggregate is None else len(self.groups)
+
+        self.data = {}
+        for name in self.reporters:
+            shape = (self.capacity, width) + columns[name].shape[1:]
+            if self.aggregate is None:
+                self.data[name] = np.zeros(shape, dtype=reporter_dtypes[name])
+            elif name == "insurance_type":
+                # households per group and insurance type
+                self.data[name] = np.zeros((self.capacity, width, n_insurance_types), dtype=np.int64)
+            else:
+                self.data[name] = np.zeros(shape, dtype=np.float64)
+
+    def grow(self):
+        self.capacity *= 2
+        for name, array in self.data.items():
+            grown = np.zeros((self.capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(self.steps)] = array[:len(self.steps)]
+            self.data[name] = grown
+
+    def collect(self, model):
+        if self.data is None:
+            self.allocate(model)
+        if len(self.steps) == self.capacity:
+            self.grow()
+        t = len(self.steps)
+        columns = model.population.columns
+        for name in self.reporters:
+            if self.aggregate is None:
+                self.data[name][t] = columns[name]
+            else:
+                self.data[name][t] = self.group_sums(name, columns[name])
+        self.steps.append(model.schedule.steps)
+
+    def group_sums(self, name, values):
+        n_groups = len(self.groups)
+        if name == "insurance_type":
+            codes = self.group_codes * n_insurance_types + values.astype(np.int64)
+            return np.bincount(codes, minlength=n_groups * n_insurance_types).reshape(
+                n_groups, n_insurance_types
+            )
+        values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+        if values.ndim == 1:
+            return np.bincount(self.group_codes, values, minlength=n_groups)
+        return np.stack(
+            [np.bincount(self.group_codes, values[:, i], minlength=n_groups) for i in range(values.shape[1])],
+            axis=1,
+        )
+
+    def arrays(self):
+        # reporter arrays trimmed to the collected steps, first axis in steps order
+        return {name: array[:len(self.steps)] for name, array in self.data.items()}
+
+    def frame(self):
+        # long DataFrame with one row per step and agent (or group) and typed columns;
+        # per agent it has the layout of population.results_frame with damage_0..R-1
+        arrays = self.arrays()
+        n_steps = len(self.steps)
+        if self.aggregate is None:
+            width = len(self.unique_id)
+            result = {"Step": np.repeat(self.steps, width), "AgentID": np.tile(self.unique_id, n_steps)}
+        else:
+            width = len(self.groups)
+            result = {
+                "Step": np.repeat(self.steps, width),
+                self.aggregate: np.tile(np.asarray(self.groups), n_steps),
+                "households": np.tile(self.households, n_steps),
+            }
+        result = pd.DataFrame(result)
+
+        for name, array in arrays.items():
+            if name == "insurance_type" and self.aggregate is None:
+                result[name] = pd.Categorical.from_codes(
+                    array.reshape(-1), categories=vectorized.insurance_types
+                )
+            elif name == "insurance_type":
+                for k, insurance_type in enumerate(vectorized.insurance_types):
+                    result["{}_households".format(insurance_type)] = array[:, :, k].reshape(-1)
+            elif array.ndim == 3:
+                for i in range(array.shape[2]):
+                    result["{}_{}".format(name, i)] = array[:, :, i].reshape(-1)
+            else:
+                result[name] = array.reshape(-1)
+        return result
+
+    def nbytes(self):
+        return sum(array.nbytes for array in self.data.values()) if self.data else 0
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+import results_store
+import vectorized
+
+# Scenario comparison on arrays. Every scenario of a results_store directory is loaded
+# into (S, N) arrays in the structure_id order of structures.parquet, so deltas between
+# scenarios, insurance-type transitions and per-tract rollups are plain array operations
+# with no joins. Scenario files written by results_store already share that order; a
+# file in another order is put back into it with one sorted lookup.
+
+value_columns = ["EAD", "elevation", "insurance_coverage"]
+n_insurance_types = len(vectorized.insurance_types)
+
+
+def alignment(reference_ids, structure_ids):
+    # positions in structure_ids of every reference id, None when already aligned
+    reference_ids = np.asarray(reference_ids)
+    structure_ids = np.asarray(structure_ids)
+    if len(reference_ids) == len(structure_ids) and np.array_equal(reference_ids, structure_ids):
+        return None
+    order = np.argsort(structure_ids, kind="stable")
+    positions = np.searchsorted(structure_ids, reference_ids, sorter=order)
+    positions = order[np.minimum(positions, len(order) - 1)]
+    if len(structure_ids) != len(reference_ids) or not np.array_equal(structure_ids[positions], reference_ids):
+        raise ValueError("scenario structure_ids do not match structures.parquet")
+    return positions
+
+
+class scenario_comparison:
+    def __init__(self, scenarios, directory="data/results", tract_column="GEOID"):
+        # scenarios: list of (policy, covered_census_tracts)
+        self.scenarios = [tuple(scenario) for scenario in scenarios]
+        self.index = {scenario: s for s, scenario in enumerate(self.scenarios)}
+        structures = results_store.read_structures(directory, ["structure_id", tract_column])
+        self.structure_id = structures["structure_id"].to_numpy()
+        self.tract_codes, self.tracts = pd.factorize(structures[tract_column], use_na_sentinel=False)
+
+        n_scenarios = len(self.scenarios)
+        n_structures = len(self.structure_id)
+        self.values = {
+            "EAD": np.empty((n_scenarios, n_structures), dtype=np.float64),
+            "elevation": np.empty((n_scenarios, n_structures), dtype=np.float32),
+            "insurance_coverage": np.empty((n_scenarios, n_structures), dtype=np.float32),
+        }
+        self.insurance_type = np.empty((n_scenarios, n_structures), dtype=np.int8)
+
+        for s, (policy, covered_census_tracts) in enumerate(self.scenarios):
+            result = results_store.read_scenario(
+                policy,
+                covered_census_tracts,
+                directory,
+                columns=["structure_id", "insurance_type"] + value_columns,
+            )
+            positions = alignment(self.structure_id, result["structure_id"].to_numpy())
+            if positions is not None:
+                result = result.iloc[positions]
+            for column in value_columns:
+                self.values[column][s] = result[column].to_numpy()
+            self.insurance_type[s] = pd.Categorical(
+                result["insurance_type"], categories=vectorized.insurance_types
+            ).codes
+
+    def rows(self, scenarios):
+        return np.array([self.index[tuple(scenario)] for scenario in scenarios], dtype=np.int64)
+
+    def delta(self, column, scenario, baseline):
+        # (N,) scenario minus baseline per structure
+        values = self.values[column]
+        return values[self.index[tuple(scenario)]] - values[self.index[tuple(baseline)]]
+
+    def baseline_deltas(self, column, baseline):
+        # (S, N) every scenario minus the baseline
+        values = self.values[column]
+        return values - values[self.index[tuple(baseline)]]
+
+    def pairwise_deltas(self, column, pairs):
+        # (P, N) second minus first scenario of every (first, second) pair
+        values = self.values[column]
+        first = self.rows([pair[0] for pair in pairs])
+        second = self.rows([pair[1] for pair in pairs])
+        return values[second] - values[first]
+
+    def pairwise_totals(self, column):
+        # (S, S) DataFrame of total(column) of the column scenario minus the row scenario
+        totals = self.values[column].sum(axis=1, dtype=np.float64)
+        labels = ["{}_{}".format(*scenario) for scenario in self.scenarios]
+        return pd.DataFrame(totals[None, :] - totals[:, None], index=labels, columns=labels)
+
+    def transitions(self, scenario, baseline):
+        # (3, 3) households moving from the baseline insurance type (rows) to the
+        # scenario's (columns)
+        before = self.insurance_type[self.index[tuple(baseline)]].astype(np.int64)
+        after = self.insurance_type[self.index[tuple(scenario)]].astype(np.int64)
+        counts = np.bincount(before * n_insurance_types + after, minlength=n_insurance_types ** 2)
+        return pd.DataFrame(
+            counts.reshape(n_insurance_types, n_insurance_types),
+            index=vectorized.insurance_types,
+            columns=vectorized.insurance_types,
+        )
+
+    def all_transitions(self, baseline):
+        # (S, 3, 3) transition counts of every scenario against the baseline
+        n_scenarios = len(self.scenarios)
+        before = self.insurance_type[self.index[tuple(baseline)]].astype(np.int64)
+        codes = (
+            np.arange(n_scenarios)[:, None] * n_insurance_types ** 2
+            + before[None, :] * n_insurance_types
+            + self.insurance_type.astype(np.int64)
+        )
+        counts = np.bincount(codes.ravel(), minlength=n_scenarios * n_insurance_types ** 2)
+        return counts.reshape(n_scenarios, n_insurance_types, n_insurance_types)
+
+    def tract_sums(self, values):
+        # (S, T) per-tract sums of (S, N) values
+        n_tracts = len(self.tracts)
+        codes = np.arange(len(values))[:, None] * n_tracts + self.tract_codes[None, :]
+        return np.bincount(
+            codes.ravel(), np.asarray(values, dtype=np.float64).ravel(), minlength=len(values) * n_tracts
+        ).reshape(len(values), n_tracts)
+
+    def tract_rollup(self, baseline):
+        # one row per scenario and tract: households, totals, and changes against the baseline
+        n_scenarios = len(self.scenarios)
+        n_tracts = len(self.tracts)
+        base = self.index[tuple(baseline)]
+        households = np.bincount(self.tract_codes, minlength=n_tracts)
+        EAD = self.tract_sums(self.values["EAD"])
+        elevated = self.tract_sums(self.values["elevation"] > 0)
+        insured = self.tract_sums(self.insurance_type > 0)
+        coverage = self.tract_sums(self.values["insurance_coverage"])
+        changed = self.tract_sums(self.insurance_type != self.insurance_type[base])
+
+        rollup = pd.DataFrame({
+            "policy": np.repeat([scenario[0] for scenario in self.scenarios], n_tracts),
+            "covered_census_tracts": np.repeat([scenario[1] for scenario in self.scenarios], n_tracts),
+            "GEOID": np.tile(self.tracts.astype(str), n_scenarios),
+            "households": np.tile(households, n_scenarios),
+            "total_EAD": EAD.ravel(),
+            "EAD_change": (EAD - EAD[base]).ravel(),
+            "elevated_households": elevated.ravel().astype(np.int64),
+            "elevated_change": (elevated - elevated[base]).ravel().astype(np.int64),
+            "insured_households": insured.ravel().astype(np.int64),
+            "insured_change": (insured - insured[base]).ravel().astype(np.int64),
+            "mean_coverage": (coverage / np.maximum(households, 1)).ravel(),
+            "insurance_type_changes": changed.ravel().astype(np.int64),
+        })
+        return rollup
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+# Depth-damage curves by building type. A registry maps every building_type to a curve
+# that turns flood heights in feet into a damage fraction of the house value for a whole
+# array at once. The two cubic polynomials of the original model are built in;
+# tabulated curves (e.g. HAZUS or USACE tables by occupancy and number of stories) are
+# loaded once, converted to feet and fractions, and evaluated by linear interpolation.
+# A building_type without a curve is an error.
+
+
+class polynomial_curve:
+    # damage percentage as a polynomial in the flood height in meters, highest power first
+    def __init__(self, coefficients):
+        self.coefficients = tuple(coefficients)
+
+    def __call__(self, flood_elevation_feet):
+        flood_elevation = 0.3048 * flood_elevation_feet
+        a, b, c, d = self.coefficients
+        return (a * (flood_elevation ** 3) + b * (flood_elevation ** 2) + c * flood_elevation + d) / 100
+
+
+class tabulated_curve:
+    # piecewise linear between (depth, damage) points, flat beyond the first and last one
+    def __init__(self, depths, damages, depth_unit="ft", percent=True):
+        depths = np.asarray(depths, dtype=float)
+        damages = np.asarray(damages, dtype=float)
+        order = np.argsort(depths, kind="stable")
+        self.depths = depths[order] / 0.3048 if depth_unit == "m" else depths[order]
+        self.damages = damages[order] / 100 if percent else damages[order]
+
+    def __call__(self, flood_elevation_feet):
+        return np.interp(flood_elevation_feet, self.depths, self.damages)
+
+
+class curve_registry:
+    def __init__(self, curves=None):
+        self.curves = dict(curves or {})
+
+    def __contains__(self, building_type):
+        return building_type in self.curves
+
+    def __getitem__(self, building_type):
+        return self.curves[building_type]
+
+    def register(self, building_type, curve):
+        self.curves[building_type] = curve
+        return curve
+
+    def load_table(
+            self,
+            table,
+            type_column="occupancy",
+            depth_column="depth",
+            damage_column="damage",
+            stories_column=None,
+            depth_unit="ft",
+            percent=True,
+    ):
+        # one curve per type (and number of stories, registered as "<type>-<stories>")
+        # from a long table or CSV path with one row per depth point
+        if isinstance(table, str):
+            table = pd.read_csv(table)
+        keys = [type_column] if stories_column is None else [type_column, stories_column]
+        names = []
+        for key, curve_table in table.groupby(keys, sort=False):
+            key = key if isinstance(key, tuple) else (key,)
+            name = "-".join(str(part) for part in key)
+            self.register(
+                name,
+                tabulated_curve(
+                    curve_table[depth_column], curve_table[damage_column], depth_unit, percent
+                ),
+            )
+            names.append(name)
+        return names
+
+    def check(self, building_types):
+        unknown = sorted({str(building_type) for building_type in building_types} - set(self.curves))
+        if unknown:
+            raise ValueError(
+                "no depth-damage curve for building_type {}; registered curves: {} "
+                "(add one with damage_curves.registry.register)".format(unknown, sorted(self.curves))
+            )
+
+    def evaluate(self, building_type, flood_elevation_feet):
+        # damage fraction for building types broadcasting against the flood heights,
+        # e.g. (H, 1, 1) types and (H, E, R) heights
+        flood_elevation_feet = np.asarray(flood_elevation_feet, dtype=float)
+        building_type = np.asarray(building_type, dtype=object)
+        codes, types = pd.factorize(building_type.reshape(-1), use_na_sentinel=False)
+        self.check(types)
+        if len(types) == 1:
+            return self.curves[types[0]](flood_elevation_feet)
+
+        shape = np.broadcast_shapes(building_type.shape, flood_elevation_feet.shape)
+        codes = np.broadcast_to(codes.reshape(building_type.shape), shape)
+        flood_elevation_feet = np.broadcast_to(flood_elevation_feet, shape)
+        damage = np.empty(shape)
+        for k, name in enumerate(types):
+            selected = codes == k
+            damage[selected] = self.curves[name](flood_elevation_feet[selected])
+        return damage
+
+
+registry = curve_registry({
+    "residential": polynomial_curve((0.2391, -3.5524, 19.933, 11.623)),
+    "non-residential": polynomial_curve((-0.1347, 1.1448, 9.1078, 4.4057)),
+})
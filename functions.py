@@ -1,11 +1,15 @@
 # %%
+import numpy as np
 import pandas as pd
 from numpy.ma.core import absolute
 
+import damage_curves
 import parameters
 from scipy.stats import poisson
 
-rate_table = pd.read_csv("data/rate_table.csv", header=0)
+rate_table_path = "data/rate_table.csv"
+# data/rate_table.csv and its compiled index, read on first use rather than at import
+rate_cache = {}
 
 
 def flood_frequency(height, mu, scale, shape):
@@ -14,30 +18,107 @@ def flood_frequency(height, mu, scale, shape):
     return number_exceeds_height
 
 
-# def SLR(projection_year, scenario):
-#     location = 0.0017 * projection_year + scenario * projection_year**2
-#     return location
+def flood_height(number_exceeds_height, mu, scale, shape):
+    # inverse of flood_frequency: the height exceeded number_exceeds_height times a year
+    return mu + scale / shape * (number_exceeds_height ** (-shape) - 1)
+
+
+def SLR(projection_year, scenario):
+    # sea level rise in meters projection_year years after the base year of the curve:
+    # 1.7 mm/yr historic trend plus scenario (m/yr^2) acceleration, see projection.py
+    location = 0.0017 * projection_year + scenario * projection_year ** 2
+    return location
+
+
+def compile_rate_table(rate_table):
+    # zone -> (heights ascending, building rates, contents rates), where each rate is the
+    # lowest rate among the rows at or below that height, so a lookup is one binary search
+    rate_index = {}
+    for zone, zone_table in rate_table.groupby("zone"):
+        zone_table = zone_table.sort_values("height", kind="stable")
+        rate_index[zone] = (
+            zone_table["height"].to_numpy(dtype=float),
+            np.minimum.accumulate(zone_table["building"].to_numpy(dtype=float)),
+            np.minimum.accumulate(zone_table["contents"].to_numpy(dtype=float)),
+        )
+    return rate_index
+
+
+def load_rate_table():
+    if "rate_table" not in rate_cache:
+        rate_cache["rate_table"] = pd.read_csv(rate_table_path, header=0)
+    return rate_cache["rate_table"]
+
+
+def default_rate_index():
+    if "rate_index" not in rate_cache:
+        rate_cache["rate_index"] = compile_rate_table(load_rate_table())
+    return rate_cache["rate_index"]
+
+
+def __getattr__(name):
+    # functions.rate_table and functions.rate_index stay available, loaded lazily
+    if name == "rate_table":
+        return load_rate_table()
+    if name == "rate_index":
+        return default_rate_index()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def get_rate_NFIP_array(zones, heights, zone_categories=None, zone_rates=None):
+    # zones are zone names, or integer codes into zone_categories; zone_rates is a
+    # compile_rate_table result and defaults to the one built from data/rate_table.csv
+    if zone_rates is None:
+        zone_rates = default_rate_index()
+    heights = np.asarray(heights, dtype=float)
+    if zone_categories is None:
+        zones = np.asarray(zones, dtype=object)
+        zone_categories, codes = np.unique(zones.ravel(), return_inverse=True)
+        zones = codes.reshape(zones.shape)
+    present_codes = np.unique(zones)
+    zones = np.broadcast_to(zones, heights.shape)
+    building_rates = np.empty(heights.shape)
+    contents_rates = np.empty(heights.shape)
+    for code in present_codes:
+        zone = zone_categories[code]
+        if zone not in zone_rates:
+            raise ValueError("No NFIP rates for flood zone {!r}".format(zone))
+        zone_heights, zone_building, zone_contents = zone_rates[zone]
+        in_zone = zones == code
+        row = np.searchsorted(zone_heights, heights[in_zone], side="right") - 1
+        if (row < 0).any():
+            raise ValueError(
+                "No NFIP rates for flood zone {!r} below height {}".format(zone, zone_heights[0])
+            )
+        building_rates[in_zone] = zone_building[row]
+        contents_rates[in_zone] = zone_contents[row]
+    return building_rates, contents_rates
 
 
 def get_rate_NFIP(zone, height):
-    # print(zone, height)
     # TODO: make sure this is correct
-    building_rate = (
-        rate_table.loc[
-            (rate_table["zone"] == zone) & (rate_table["height"] <= height), "building"
-        ]
-        .sort_values(ascending=True)
-        .values[0]
-    )
-    contents_rate = (
-        rate_table.loc[
-            (rate_table["zone"] == zone) & (rate_table["height"] <= height), "contents"
-        ]
-        .sort_values(ascending=True)
-        .values[0]
-    )
-    # print(zone, height)
-    # print(building_rate)
+    building_rate, contents_rate = get_rate_NFIP_array(zone, height)
+    return building_rate[()], contents_rate[()]
+
+
+def insurance_rate_array(
+        insurance_type,
+        zones,
+        heights,
+        CRS_rewards,
+        zone_categories=None,
+        zone_rates=None,
+):
+    building_rate, contents_rate = get_rate_NFIP_array(zones, heights, zone_categories, zone_rates)
+
+    building_rate -= building_rate * CRS_rewards
+    contents_rate -= contents_rate * CRS_rewards
+
+    if insurance_type == "private":
+        # private rates are three times the NFIP rates, see insurance_rate
+        building_rate = building_rate * 3
+        contents_rate = contents_rate * 3
+
     return building_rate, contents_rate
 
 
@@ -75,22 +156,8 @@ def elevation_cost(elevation, area):
 
 
 def damage_assessment(building_type, flood_elevation_feet):
-    flood_elevation = 0.3048 * flood_elevation_feet
-    if building_type == "residential":
-        damage = (
-                         0.2391 * (flood_elevation ** 3)
-                         - 3.5524 * (flood_elevation ** 2)
-                         + 19.933 * flood_elevation
-                         + 11.623
-                 ) / 100
-    else:
-        damage = (
-                         -0.1347 * (flood_elevation ** 3)
-                         + 1.1448 * (flood_elevation ** 2)
-                         + 9.1078 * flood_elevation
-                         + 4.4057
-                 ) / 100
-    return damage
+    # curves by building type from damage_curves.registry
+    return float(damage_curves.registry.evaluate(building_type, flood_elevation_feet))
 
 
 def risk_mitigation_cost(
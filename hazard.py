@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+import functions
+import parameters
+import vectorized
+
+# EAD over the continuous exceedance curve instead of the trapezoid over
+# return_period_list. Between a household's return-period points the flood elevation is
+# interpolated linearly in the GEV flood height of functions.flood_frequency
+# (parameters.location/scale/shape), and past the rarest point it keeps growing along the
+# GEV up to max_return_period. The integral over the exceedance probability uses
+# Gauss-Legendre nodes in log probability, computed once and shared by every household.
+# Set model.hazard = hazard.hazard_curve(n_nodes) to use it for EAD and EAD_no_action.
+
+
+class hazard_curve:
+    def __init__(
+            self,
+            n_nodes=32,
+            max_return_period=1000,
+            location=None,
+            scale=None,
+            shape=None,
+    ):
+        self.n_nodes = n_nodes
+        self.max_return_period = max_return_period
+        self.location = parameters.location if location is None else location
+        self.scale = parameters.scale if scale is None else scale
+        self.shape = parameters.shape if shape is None else shape
+        # nodes and weights on [-1, 1]
+        self.nodes, self.weights = np.polynomial.legendre.leggauss(n_nodes)
+
+    def height(self, probability):
+        return functions.flood_height(probability, self.location, self.scale, self.shape)
+
+    def node_probabilities(self, return_periods):
+        # (1 or H, K) exceedance probabilities from 1 / max_return_period to the most
+        # frequent return period, and the weights of dp at them
+        upper = np.log(1 / return_periods[:, :1])
+        lower = np.log(1 / self.max_return_period)
+        half_width = (upper - lower) / 2
+        probability = np.exp(lower + half_width * (self.nodes + 1))
+        return probability, half_width * self.weights * probability
+
+    def depths(self, flood_elevations, return_periods):
+        # (H, K) flood elevations at the node probabilities and (1 or H, K) weights
+        return_periods = np.asarray(return_periods, dtype=float)
+        if return_periods.ndim == 1:
+            return_periods = return_periods[None, :]
+        flood_elevations = np.asarray(flood_elevations, dtype=float)
+        probability, weights = self.node_probabilities(return_periods)
+        n_households, n_points = flood_elevations.shape
+        if n_points == 1:
+            return np.repeat(flood_elevations, self.n_nodes, axis=1), weights
+
+        point_height = np.broadcast_to(self.height(1 / return_periods), flood_elevations.shape)
+        node_height = np.broadcast_to(self.height(probability), (n_households, self.n_nodes))
+        # segment of every node, the last one also extrapolates past the rarest point
+        segment = np.clip((node_height[:, :, None] >= point_height[:, None, :]).sum(axis=2), 1, n_points - 1)
+        height_0 = np.take_along_axis(point_height, segment - 1, axis=1)
+        height_1 = np.take_along_axis(point_height, segment, axis=1)
+        depth_0 = np.take_along_axis(flood_elevations, segment - 1, axis=1)
+        depth_1 = np.take_along_axis(flood_elevations, segment, axis=1)
+        depths = depth_0 + (depth_1 - depth_0) * (node_height - height_0) / (height_1 - height_0)
+        # the tail never drops below the rarest point
+        beyond = node_height > point_height[:, -1:]
+        depths = np.where(beyond, np.maximum(depths, flood_elevations[:, -1:]), depths)
+        return depths, weights
+
+    def EAD(
+            self,
+            flood_elevations,
+            return_periods,
+            house_elevation,
+            building_type,
+            house_value,
+            public_risk_reduction,
+    ):
+        # (H, E) EAD for (H, E) house elevations, with the same damages as the trapezoid
+        # path (functions.prospect_utility_action, vectorized.EAD_array), so that
+        # switching model.hazard only changes the integration
+        depths, weights = self.depths(flood_elevations, return_periods)
+        house_value = np.asarray(house_value, dtype=float)
+        damage = vectorized.damage_batch(
+            depths, house_elevation, building_type, house_value, public_risk_reduction
+        )
+        return (damage * weights[:, None, :]).sum(axis=2)
+
+
+def convergence(
+        flood_elevations,
+        return_periods,
+        property_height,
+        building_type,
+        house_value,
+        node_counts=(2, 4, 8, 16, 32, 64),
+        reference_nodes=512,
+        max_return_period=1000,
+):
+    # no-action EAD per node count against a reference_nodes integration, plus the
+    # trapezoid over return_periods for comparison
+    house_elevation = np.asarray(property_height, dtype=float)[:, None]
+    building_type = np.asarray(building_type, dtype=object)
+    house_value = np.asarray(house_value, dtype=float)
+    no_reduction = np.zeros(len(house_value))
+
+    def household_EAD(n_nodes):
+        curve = hazard_curve(n_nodes, max_return_period)
+        return curve.EAD(
+            flood_elevations, return_periods, house_elevation, building_type, house_value, no_reduction
+        )[:, 0]
+
+    reference = household_EAD(reference_nodes)
+    estimates = [("trapezoid", np.shape(return_periods)[-1], vectorized.initial_EAD_batch(
+        flood_elevations, return_periods, property_height, building_type, house_value
+    ))]
+    estimates += [("quadrature", n_nodes, household_EAD(n_nodes)) for n_nodes in node_counts]
+
+    rows = []
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for method, n_nodes, EAD in estimates:
+            household_error = np.abs(EAD - reference) / np.abs(reference)
+            rows.append({
+                "method": method,
+                "n_nodes": n_nodes,
+                "total_EAD": float(EAD.sum()),
+                "relative_error": float(abs(EAD.sum() - reference.sum()) / abs(reference.sum())),
+                "max_relative_error": float(np.nanmax(household_error)),
+            })
+    return pd.DataFrame(rows)
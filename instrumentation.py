@@ -0,0 +1,141 @@
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+# Runtime visibility for adaptation_simulation: wall time per stage, counters of the hot
+# paths (prospect utility and rate lookups) and optionally a sampled trace of household
+# decisions. Models get the no-op null_profiler unless a profiler is passed in or the
+# FLOOD_ABM_PROFILE environment variable names an output directory, so production runs
+# can be profiled without editing code.
+
+profile_variable = "FLOOD_ABM_PROFILE"
+trace_rate_variable = "FLOOD_ABM_TRACE_RATE"
+
+trace_fields = [
+    "risk_perception",
+    "PU_no_action",
+    "EAD_no_action",
+    "chosen",
+    "PU",
+    "EAD",
+    "elevation",
+    "insurance_type",
+    "insurance_coverage",
+    "evaluated_options",
+    "pruned_options",
+]
+
+
+class null_profiler:
+    enabled = False
+    output_directory = None
+
+    def stage(self, name):
+        return nullcontext()
+
+    def count(self, name, n=1):
+        pass
+
+    def trace(self, step, unique_id, decisions):
+        pass
+
+
+class profiler:
+    enabled = True
+
+    def __init__(self, trace_rate=0.0, seed=0, max_events=1000000, output_directory=None):
+        self.trace_rate = trace_rate
+        self.rng = np.random.default_rng(seed)
+        self.max_events = max_events
+        self.output_directory = output_directory
+        self.started = time.time()
+        self.stage_seconds = defaultdict(float)
+        self.stage_calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.events = []
+        self.dropped_events = 0
+
+    def event(self, kind, **payload):
+        if len(self.events) < self.max_events:
+            self.events.append({"time": time.time() - self.started, "kind": kind, **payload})
+        else:
+            self.dropped_events += 1
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stage_seconds[name] += elapsed
+            self.stage_calls[name] += 1
+            self.event("stage", name=name, seconds=elapsed)
+
+    def count(self, name, n=1):
+        self.counters[name] += int(n)
+
+    def trace(self, step, unique_id, decisions):
+        # records a trace_rate sample of the households of one decision batch
+        if not self.trace_rate:
+            return
+        sampled = np.flatnonzero(self.rng.random(len(decisions["chosen"])) < self.trace_rate)
+        for i in sampled:
+            self.event(
+                "decision",
+                step=int(step),
+                unique_id=np.asarray(unique_id)[i].item(),
+                policy=decisions["policy"],
+                **{
+                    name: np.asarray(decisions[name])[i].item()
+                    for name in trace_fields
+                    if name in decisions
+                },
+            )
+
+    def summary(self):
+        return {
+            "stages": {
+                name: {"seconds": self.stage_seconds[name], "calls": self.stage_calls[name]}
+                for name in self.stage_seconds
+            },
+            "counters": dict(self.counters),
+            "trace_rate": self.trace_rate,
+            "events": len(self.events),
+            "dropped_events": self.dropped_events,
+        }
+
+    def write_json(self, path):
+        with open(path, "w") as summary_file:
+            json.dump(self.summary(), summary_file, indent=2)
+
+    def write_event_log(self, path):
+        # one JSON object per line
+        with open(path, "w") as event_file:
+            for event in self.events:
+                event_file.write(json.dumps(event) + "\n")
+
+    def export(self, name):
+        # name.json and name.events.jsonl in output_directory
+        os.makedirs(self.output_directory, exist_ok=True)
+        path = os.path.join(self.output_directory, name)
+        self.write_json(path + ".json")
+        self.write_event_log(path + ".events.jsonl")
+        return path
+
+
+disabled = null_profiler()
+
+
+def from_environment():
+    output_directory = os.environ.get(profile_variable)
+    if not output_directory:
+        return disabled
+    return profiler(
+        trace_rate=float(os.environ.get(trace_rate_variable, 0)),
+        output_directory=output_directory,
+    )
@@ -0,0 +1,216 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import shapely
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.colors import BoundaryNorm, ListedColormap
+from matplotlib.patches import Patch
+
+import results_store
+import vectorized
+
+# Fast map rendering for Results Plot.py. Structure coordinates are read once from the
+# x/y columns of structures.parquet (WKT geometry only as a fallback), cached next to it
+# and binned onto a fixed grid; every scenario panel is then a bincount over the same
+# cell index drawn with imshow, so no WKT parsing, GeoDataFrame or geometry merge per
+# scenario. Scenarios are rendered in parallel.
+
+panels = {
+    "EAD": "EAD",
+    "insurance_type": "Insurance Type",
+    "insurance_coverage": "Insurance Coverage",
+    "elevation": "Elevation",
+}
+categorical_columns = {"insurance_type": vectorized.insurance_types}
+quantile_classes = 5  # mapclassify's default k for scheme="quantiles"
+
+# grid and directories set once per process
+shared_state = {}
+
+
+def read_coordinates(directory="data/results", x="x", y="y"):
+    # (N, 2) structure coordinates in results_store row order, cached as coordinates.npy
+    structures_path = os.path.join(directory, "structures.parquet")
+    cache_path = os.path.join(directory, "coordinates.npy")
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(structures_path):
+        return np.load(cache_path)
+
+    if {x, y} <= set(pq.read_schema(structures_path).names):
+        structures = results_store.read_structures(directory, [x, y])
+        coordinates = structures[[x, y]].to_numpy(dtype=float)
+    else:
+        structures = results_store.read_structures(directory, ["geometry"])
+        points = shapely.from_wkt(structures["geometry"].astype(str).to_numpy())
+        coordinates = shapely.get_coordinates(points)
+    np.save(cache_path, coordinates)
+    return coordinates
+
+
+def plot_grid(coordinates, pixels=1200):
+    # flat cell index of every structure on a grid whose longer side has `pixels` cells
+    xs = coordinates[:, 0]
+    ys = coordinates[:, 1]
+    finite = np.isfinite(xs) & np.isfinite(ys)
+    x_min, x_max = xs[finite].min(), xs[finite].max()
+    y_min, y_max = ys[finite].min(), ys[finite].max()
+    cell_size = max(x_max - x_min, y_max - y_min) / pixels or 1.0
+    width = int((x_max - x_min) // cell_size) + 1
+    height = int((y_max - y_min) // cell_size) + 1
+
+    cols = np.zeros(len(xs), dtype=np.int64)
+    rows = np.zeros(len(xs), dtype=np.int64)
+    cols[finite] = ((xs[finite] - x_min) // cell_size).astype(np.int64)
+    rows[finite] = ((ys[finite] - y_min) // cell_size).astype(np.int64)
+    cell = np.where(finite, rows * width + cols, -1)
+    return {
+        "cell": cell,
+        "shape": (height, width),
+        "extent": (x_min, x_min + width * cell_size, y_min, y_min + height * cell_size),
+    }
+
+
+def cell_mean(grid, values):
+    # (height, width) mean of values per cell, NaN where no structure falls
+    keep = (grid["cell"] >= 0) & np.isfinite(values)
+    n_cells = grid["shape"][0] * grid["shape"][1]
+    totals = np.bincount(grid["cell"][keep], values[keep], minlength=n_cells)
+    counts = np.bincount(grid["cell"][keep], minlength=n_cells)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = totals / counts
+    return mean.reshape(grid["shape"])
+
+
+def cell_majority(grid, codes, n_categories):
+    # (height, width) most frequent category code per cell, NaN where empty
+    keep = (grid["cell"] >= 0) & (codes >= 0)
+    n_cells = grid["shape"][0] * grid["shape"][1]
+    counts = np.bincount(
+        grid["cell"][keep] * n_categories + codes[keep], minlength=n_cells * n_categories
+    ).reshape(n_cells, n_categories)
+    majority = counts.argmax(axis=1).astype(float)
+    majority[counts.sum(axis=1) == 0] = np.nan
+    return majority.reshape(grid["shape"])
+
+
+def draw_panel(fig, ax, grid, column, values, cmap="viridis_r"):
+    if column in categorical_columns:
+        categories = categorical_columns[column]
+        image = cell_majority(grid, values, len(categories))
+        colors = plt.get_cmap(cmap, len(categories))(np.arange(len(categories)))
+        ax.imshow(
+            image, origin="lower", extent=grid["extent"], cmap=ListedColormap(colors),
+            vmin=-0.5, vmax=len(categories) - 0.5, interpolation="nearest",
+        )
+        ax.legend(
+            handles=[Patch(color=colors[k], label=name) for k, name in enumerate(categories)],
+            loc="upper left", fontsize=8,
+        )
+        return
+
+    image = cell_mean(grid, values)
+    if column == "EAD":
+        # quantile classes of the cell values, like scheme="quantiles"
+        bounds = np.unique(np.nanquantile(image, np.linspace(0, 1, quantile_classes + 1)))
+        norm = BoundaryNorm(bounds, plt.get_cmap(cmap).N) if len(bounds) > 1 else None
+    else:
+        norm = None
+    plot = ax.imshow(image, origin="lower", extent=grid["extent"], cmap=cmap, norm=norm, interpolation="nearest")
+    cbar = fig.colorbar(plot, ax=ax, shrink=0.5)
+    cbar.ax.tick_params(labelsize=8)
+
+
+def scenario_values(result, column):
+    if column in categorical_columns:
+        return pd.Categorical(result[column], categories=categorical_columns[column]).codes.astype(np.int64)
+    return result[column].to_numpy(dtype=float)
+
+
+def init_worker(grid, directory, output_directory):
+    matplotlib.use("Agg")
+    shared_state["grid"] = grid
+    shared_state["directory"] = directory
+    shared_state["output_directory"] = output_directory
+
+
+def render_scenario(scenario):
+    policy, covered_census_tracts = scenario
+    grid = shared_state["grid"]
+    result = results_store.read_scenario(
+        policy, covered_census_tracts, shared_state["directory"], columns=list(panels)
+    )
+
+    fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+    fig.suptitle("Simulation_Result_{}_{}".format(policy, covered_census_tracts))
+    for ax, (column, title) in zip(axes.flatten(), panels.items()):
+        draw_panel(fig, ax, grid, column, scenario_values(result, column))
+        ax.set_title(title)
+        ax.set_aspect("equal")
+
+    path = os.path.join(shared_state["output_directory"], "{}_{}.png".format(policy, covered_census_tracts))
+    fig.savefig(path, dpi=300, bbox_inches="tight")
+    plt.close(fig)
+    return path
+
+
+def render_difference(scenario):
+    # EAD of the previous scenario minus this one; scenario files share the row order
+    # of structures.parquet, so the two columns line up without a merge
+    policy, covered_census_tracts, previous_census_tracts = scenario
+    grid = shared_state["grid"]
+    EAD = results_store.read_scenario(
+        policy, covered_census_tracts, shared_state["directory"], columns=["EAD"]
+    )["EAD"].to_numpy(dtype=float)
+    previous_EAD = results_store.read_scenario(
+        policy, previous_census_tracts, shared_state["directory"], columns=["EAD"]
+    )["EAD"].to_numpy(dtype=float)
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    draw_panel(fig, ax, grid, "EAD_difference", previous_EAD - EAD)
+    ax.set_title("EAD Difference Census Tract: {} vs {}".format(covered_census_tracts, previous_census_tracts))
+    ax.set_aspect("equal")
+
+    path = os.path.join(
+        shared_state["output_directory"],
+        "{}_EAD_difference_{}_{}.png".format(policy, covered_census_tracts, previous_census_tracts),
+    )
+    fig.savefig(path, dpi=300, bbox_inches="tight")
+    plt.close(fig)
+    return path
+
+
+def render(function, tasks, grid, directory, output_directory, processes):
+    os.makedirs(output_directory, exist_ok=True)
+    initargs = (grid, directory, output_directory)
+    if processes == 1:
+        shared_state.update(zip(["grid", "directory", "output_directory"], initargs))
+        return [function(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=initargs) as executor:
+        return list(executor.map(function, tasks))
+
+
+def render_all(
+        policies,
+        census_tract_numbers,
+        directory="data/results",
+        output_directory="plots",
+        pixels=1200,
+        differences=True,
+        processes=None,
+):
+    # 2x2 panels per scenario and, with differences, the EAD change between consecutive
+    # census tract numbers of each policy; returns the written paths
+    grid = plot_grid(read_coordinates(directory), pixels)
+    scenarios = [(policy, n) for n in census_tract_numbers for policy in policies]
+    paths = render(render_scenario, scenarios, grid, directory, output_directory, processes)
+    if differences:
+        pairs = [
+            (policy, census_tract_numbers[i], census_tract_numbers[i - 1])
+            for i in range(1, len(census_tract_numbers))
+            for policy in policies
+        ]
+        paths += render(render_difference, pairs, grid, directory, output_directory, processes)
+    return paths
@@ -1,17 +1,85 @@
 # %%
-import matplotlib.pyplot as plt
 import pandas as pd
 import mesa
 import agent
+import population
 import collections
 from mesa.space import ContinuousSpace
 from mesa.time import SimultaneousActivation
 from mesa.agent import AgentSet
 import functions
+import instrumentation
+import parameters
+import vectorized
 import numpy as np
 from ast import literal_eval
 
 
+def household_return_periods(structure_dataframe, return_period_list, tract_return_periods=None):
+    # (H, R) return periods of every household's census tract from a table indexed by
+    # GEOID (e.g. return_periods.tract_return_periods); tracts missing from the table
+    # keep return_period_list, which is returned unchanged without a table
+    if tract_return_periods is None:
+        return return_period_list
+    tract_return_periods = pd.DataFrame(tract_return_periods)
+    tract_return_periods.index = tract_return_periods.index.astype(str)
+    return_periods = tract_return_periods.reindex(
+        structure_dataframe['GEOID'].astype(str)
+    ).to_numpy(dtype=float)
+    return_periods[np.isnan(return_periods).any(axis=1)] = return_period_list
+    return return_periods
+
+
+def scenario_invariant_state(
+        structure_dataframe,
+        return_period_list,
+        flood_elevations=None,
+        tract_return_periods=None,
+        hazard=None,
+):
+    # parsed flood lists and no-action EAD do not depend on policy, CRS or tract coverage;
+    # flood_elevations can come pre-parsed from cache.load_structures, hazard is an optional
+    # hazard.hazard_curve for the no-action EAD
+    if flood_elevations is None:
+        flood_elevations = np.array(
+            [
+                literal_eval(flood_elevation_list)
+                for flood_elevation_list in structure_dataframe['flood_elevation_list']
+            ],
+            dtype=float,
+        )
+    flood_elevations = np.asarray(flood_elevations, dtype=float)
+    return_periods = household_return_periods(
+        structure_dataframe, return_period_list, tract_return_periods
+    )
+    initial_EAD = vectorized.initial_EAD_batch(
+        flood_elevations,
+        return_periods,
+        structure_dataframe['property_height'],
+        structure_dataframe['building_type'],
+        structure_dataframe['house_value'],
+        hazard,
+    )
+    return {
+        'flood_elevations': flood_elevations,
+        'initial_EAD': initial_EAD,
+        'return_periods': return_periods,
+    }
+
+
+# per-year aggregates for datacollector model_reporters
+def total_EAD(model):
+    return float(np.nansum(model.population.columns['EAD']))
+
+
+def elevated_households(model):
+    return int((model.population.columns['elevation'] > 0).sum())
+
+
+def insured_households(model):
+    return int((model.population.columns['insurance_type'] > 0).sum())
+
+
 class adaptation_simulation(mesa.Model):
     def __init__(
             self,
@@ -21,94 +89,209 @@ class adaptation_simulation(mesa.Model):
             CRS_rewards,  # 25% or 45%(50%)
             covered_census_tracts,  # 100 or 500
             risk_reduction_percentage,
+            invariant_state=None,  # from scenario_invariant_state, shared across scenarios
+            agent_views=True,  # one Mesa agent per household, for small debugging runs
+            profiler=None,  # instrumentation.profiler; None reads FLOOD_ABM_PROFILE
+            tract_return_periods=None,  # RP table indexed by GEOID, overrides return_period_list per tract
+            collector=None,  # collection.array_collector instead of Mesa agent reporters
     ):
         super().__init__()
 
         self.structure_dataframe = structure_dataframe
 
         self.return_period_list = return_period_list
+        self.tract_return_periods = tract_return_periods
 
         self.policy = policy
         self.CRS_rewards = CRS_rewards
         self.covered_census_tracts = covered_census_tracts
         self.risk_reduction_percentage = risk_reduction_percentage
+        self.invariant_state = invariant_state
+        self.agent_views = agent_views
+        self.profiler = instrumentation.from_environment() if profiler is None else profiler
+        self.collector = collector
 
         self.elevation_options = [0, 2, 4, 6, 8]
         self.NFIP_coverage_options = [60000, 150000, 250000]
         self.private_coverage_options = [60000, 250000, 500000]
+        # any coverage between the smallest and largest option instead of the lists above
+        self.continuous_coverage = False
+        # 'exhaustive' evaluates every option, 'pruned' skips dominated and bounded ones
+        self.option_search = 'exhaustive'
+
+        self.zone_rates = functions.default_rate_index()
+        # optional vectorized.probability_weighting_table for bulk runs, None computes pi exactly
+        self.pi_table = None
+        # optional hazard.hazard_curve: EAD over the continuous exceedance curve instead of
+        # the trapezoid over return_period_list
+        self.hazard = None
 
         self.schedule = SimultaneousActivation(self)
 
+        # households whose inputs changed since their last decision
+        self.dirty = None
+        self.resolved_households = 0
+
         self.datacollector = mesa.DataCollector(
-            agent_reporters={'EAD': 'EAD',
-                             'insurance_type': 'insurance_type',
-                             'insurance_coverage': 'insurance_coverage',
-                             'elevation': 'elevation',
-                             'damage_list': 'damage_list',
-                             }
+            model_reporters={'total_EAD': total_EAD,
+                             'elevated_households': elevated_households,
+                             'insured_households': insured_households,
+                             'resolved_households': 'resolved_households',
+                             },
+            # with an array collector the agent variables go to its typed arrays
+            agent_reporters={} if collector is not None else {'EAD': 'EAD',
+                                                              'insurance_type': 'insurance_type',
+                                                              'insurance_coverage': 'insurance_coverage',
+                                                              'elevation': 'elevation',
+                                                              'damage_list': 'damage_list',
+                                                              }
         )
 
     def agent_generation(self):
-        self.structure_dataframe['initial_EAD'] = float('nan')
-        self.structure_dataframe['public_risk_reduction'] = float('nan')
-        for idx, row in self.structure_dataframe.iterrows():
-            EAD, damage_list = functions.prospect_utility_action(
-                literal_eval(row['flood_elevation_list']),
+        with self.profiler.stage('agent_generation'):
+            self.generate_agents()
+
+    def generate_agents(self):
+        if self.invariant_state is None:
+            self.invariant_state = scenario_invariant_state(
+                self.structure_dataframe,
                 self.return_period_list,
-                row['property_height'],
-                row['building_type'],
-                0,
-                0,
-                row['house_value'],
-                0,
-                0,
-                True,
+                tract_return_periods=self.tract_return_periods,
+                hazard=self.hazard,
             )
-            self.structure_dataframe.at[idx, 'initial_EAD'] = EAD
+        self.structure_dataframe['initial_EAD'] = self.invariant_state['initial_EAD']
 
         # Sort the dataframe by initial_EAD
         self.census_dataframe = self.structure_dataframe.groupby('GEOID', as_index=False).agg(
             {'initial_EAD': 'mean'}).sort_values(by='initial_EAD', ascending=False)
 
         # self.structure_dataframe = self.structure_dataframe.sort_values(by='initial_EAD', ascending=False)
-        self.max_initial_EAD = self.census_dataframe['initial_EAD'][0]
+        # the highest tract mean, census_dataframe is sorted by it
+        self.max_initial_EAD = self.census_dataframe['initial_EAD'].iloc[0]
 
         self.top_census_tracts = self.census_dataframe.head(self.covered_census_tracts)['GEOID'].to_list()
 
-        self.structure_dataframe['public_risk_reduction'] = 0.0
-        for idx, row in self.structure_dataframe.iterrows():
-            if row['GEOID'] in self.top_census_tracts:
-                self.structure_dataframe.at[idx, 'public_risk_reduction'] = self.risk_reduction_percentage
-        # print(self.structure_dataframe[self.structure_dataframe['public_risk_reduction'] > 0]['GEOID'])
-        # self.structure_dataframe.iloc[:self.covered_census_tracts,
-        # self.structure_dataframe.columns.get_loc('public_risk_reduction')] = self.risk_reduction_percentage
-
-        for idx, row in self.structure_dataframe.iterrows():
-            household_agent = agent.household(
-                unique_id=row["structure_id"],
-                model=self,
-                mortgage=row["mortgage"],
-                income=row["income"],
-                race=row["race"],
-                education=row["education"],
-                ownership=row['ownership'],
-                flood_elevation_list=literal_eval(row['flood_elevation_list']),
-                property_flood_zone=row['property_flood_zone'],
-                property_height=row['property_height'],
-                area=row['area'],
-                building_type=row['building_type'],
-                house_value=row['house_value'],
-                BFE=row['BFE'],
-                initial_EAD=EAD,
-                public_risk_reduction=row['public_risk_reduction'],
-            )
-            self.schedule.add(household_agent)
+        self.structure_dataframe['public_risk_reduction'] = np.where(
+            self.structure_dataframe['GEOID'].isin(self.top_census_tracts),
+            self.risk_reduction_percentage,
+            0.0,
+        )
+
+        self.population = population.household_population.from_dataframe(
+            self.structure_dataframe,
+            self.invariant_state['flood_elevations'],
+            self.invariant_state['initial_EAD'],
+            self.max_initial_EAD,
+        )
+        if np.ndim(self.invariant_state.get('return_periods')) == 2:
+            self.population.columns['return_periods'] = self.invariant_state['return_periods']
+        if self.agent_views:
+            for row, unique_id in enumerate(self.population.unique_id):
+                self.schedule.add(agent.household_view(unique_id, self, row))
         self.household_id = self.structure_dataframe["structure_id"].tolist()
+        self.dirty = np.ones(len(self.population), dtype=bool)
 
     def storm_surge(self):
         self.storm_surge_height = 0
         return self.storm_surge_height
 
+    def set_CRS_rewards(self, CRS_rewards):
+        # every option carries insurance, so a new discount touches every household
+        if CRS_rewards != self.CRS_rewards:
+            self.CRS_rewards = CRS_rewards
+            self.dirty[:] = True
+
+    def set_public_protection(self, covered_census_tracts=None, risk_reduction_percentage=None):
+        if covered_census_tracts is not None:
+            self.covered_census_tracts = covered_census_tracts
+        if risk_reduction_percentage is not None:
+            self.risk_reduction_percentage = risk_reduction_percentage
+        self.protect_tracts(self.census_dataframe.head(self.covered_census_tracts)['GEOID'].to_list())
+
+    def protect_tracts(self, tracts, risk_reduction_percentage=None):
+        # any set of census tracts, e.g. from targeting.optimize_targets; only households
+        # whose protection changed re-decide
+        if risk_reduction_percentage is not None:
+            self.risk_reduction_percentage = risk_reduction_percentage
+        self.top_census_tracts = list(tracts)
+        self.structure_dataframe['public_risk_reduction'] = np.where(
+            self.structure_dataframe['GEOID'].isin(self.top_census_tracts),
+            self.risk_reduction_percentage,
+            0.0,
+        )
+        self.dirty |= self.population.set_public_risk_reduction(
+            self.structure_dataframe['public_risk_reduction'].to_numpy(dtype=float),
+            self.max_initial_EAD,
+        )
+
+    def set_rate_table(self, rate_table):
+        # premiums changed: only households in zones whose rates moved re-decide
+        zone_rates = functions.compile_rate_table(rate_table)
+        changed_zones = [
+            zone
+            for zone in set(zone_rates) | set(self.zone_rates)
+            if zone not in zone_rates
+               or zone not in self.zone_rates
+               or any(
+                not np.array_equal(new, old)
+                for new, old in zip(zone_rates[zone], self.zone_rates[zone])
+            )
+        ]
+        self.zone_rates = zone_rates
+        zone_categories = self.population.categories['property_flood_zone']
+        changed_codes = [code for code, zone in enumerate(zone_categories) if zone in changed_zones]
+        self.dirty |= np.isin(self.population.columns['property_flood_zone'], changed_codes)
+
+    def reset_decisions(self):
+        # everyone decides from scratch at the next step, as in a freshly generated model
+        self.population.reset_decisions()
+        self.dirty[:] = True
+
+    def decide(self):
+        # households whose inputs changed decide again in one batched pass over the
+        # population columns; everyone else carries their decision forward
+        rows = None if self.dirty.all() else np.flatnonzero(self.dirty)
+        self.resolved_households = int(self.dirty.sum())
+        if self.resolved_households:
+            self.population.columns['PU'][self.dirty] = parameters.M
+            with self.profiler.stage('probability_weights'):
+                self.population.probability_weights(self.return_period_list, self.pi_table)
+            decisions = vectorized.household_decisions(
+                self, self.population.decision_inputs(rows)
+            )
+            with self.profiler.stage('apply_decision'):
+                self.population.apply_decision(decisions, rows)
+            if self.profiler.enabled:
+                unique_id = self.population.unique_id
+                self.profiler.trace(
+                    self.schedule.steps, unique_id if rows is None else unique_id[rows], decisions
+                )
+            self.dirty[:] = False
+
     def step(self):
-        self.schedule.step()
-        self.datacollector.collect(self)
+        with self.profiler.stage('step'):
+            self.decide()
+            self.schedule.steps += 1
+            self.schedule.time += 1
+            with self.profiler.stage('collect'):
+                self.datacollector.collect(self)
+                if self.collector is not None:
+                    self.collector.collect(self)
+
+    def run_years(self, n_years, changes=None):
+        # changes maps a year index to new inputs for that year, e.g.
+        # {5: {'CRS_rewards': 0.45}, 10: {'covered_census_tracts': 25, 'rate_table': table}}
+        changes = changes or {}
+        for year in range(n_years):
+            year_changes = changes.get(year, {})
+            if 'CRS_rewards' in year_changes:
+                self.set_CRS_rewards(year_changes['CRS_rewards'])
+            if 'covered_census_tracts' in year_changes or 'risk_reduction_percentage' in year_changes:
+                self.set_public_protection(
+                    year_changes.get('covered_census_tracts'),
+                    year_changes.get('risk_reduction_percentage'),
+                )
+            if 'rate_table' in year_changes:
+                self.set_rate_table(year_changes['rate_table'])
+            self.step()
+        return self.datacollector.get_model_vars_dataframe()
@@ -0,0 +1,143 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Stochastic hurricane seasons on top of the analytic EAD. Each simulated year draws
+# the most severe return-period band reached that season (band k has an annual
+# exceedance probability of 1 / return_period_list[k]; -1 means no damaging storm),
+# and every household loses the damage it would suffer in that band under its chosen
+# elevation, insurance coverage and public risk reduction. With per-tract return periods
+# ((H, R), as in population.columns["return_periods"]) a season's storm has the same
+# exceedance probability everywhere, and each tract reads its own band from it.
+
+
+def exceedance_probabilities(return_period_list):
+    return 1 / np.asarray(return_period_list, dtype=float)
+
+
+def band_probabilities(return_period_list):
+    # probability that band k is the most severe band of a year, and of no event, along
+    # the last axis of (R,) or (H, R) return periods
+    probability = exceedance_probabilities(return_period_list)
+    band = probability - np.concatenate(
+        [probability[..., 1:], np.zeros(probability.shape[:-1] + (1,))], axis=-1
+    )
+    return band, 1 - probability[..., 0]
+
+
+def return_period_groups(return_period_list, n_households):
+    # (G, R) distinct return-period rows and the (H,) group of every household
+    return_periods = np.asarray(return_period_list, dtype=float)
+    if return_periods.ndim == 1:
+        return return_periods[None, :], np.zeros(n_households, dtype=np.int64)
+    groups, codes = np.unique(return_periods, axis=0, return_inverse=True)
+    return groups, codes.reshape(-1)
+
+
+def band_losses(damage, insurance_coverage, codes, n_groups):
+    # (H, R) damages -> per-group band totals (G, R + 1) whose last entry is the
+    # no-event year, so that band index -1 reads a zero loss
+    damage = np.asarray(damage, dtype=float)
+    insured = np.minimum(damage, np.asarray(insurance_coverage, dtype=float)[:, None])
+
+    def group_totals(values):
+        totals = np.zeros((n_groups, values.shape[1] + 1))
+        for k in range(values.shape[1]):
+            totals[:, k] = np.bincount(codes, values[:, k], minlength=n_groups)
+        return totals
+
+    return {"total": group_totals(damage), "insured": group_totals(insured)}
+
+
+def sample_bands(draws, exceedance_probability):
+    # (S, Y) index of the most severe band reached each year, -1 for no event
+    return (draws[..., None] < exceedance_probability).sum(axis=-1) - 1
+
+
+def simulate_stream(arguments):
+    exceedance_probability, totals, n_sequences, n_years, seed_sequence = arguments
+    rng = np.random.default_rng(seed_sequence)
+    draws = rng.random((n_sequences, n_years))
+    losses = {name: np.zeros(draws.shape) for name in totals}
+    for g, probability in enumerate(exceedance_probability):
+        bands = sample_bands(draws, probability)
+        for name, total in totals.items():
+            losses[name] += total[g][bands]
+    return losses
+
+
+def simulate_seasons(
+        population,
+        return_period_list,
+        n_sequences=10000,
+        n_years=30,
+        seed=0,
+        sequences_per_stream=1000,
+        processes=1,
+        quantiles=(0.5, 0.9, 0.99, 0.996),
+):
+    # Each block of sequences_per_stream sequences has its own spawned random stream, so
+    # the results only depend on seed, never on how many processes share the work.
+    # return_period_list can be (H, R); the population's own per-tract ones take precedence.
+    columns = population.columns
+    return_period_list = columns.get("return_periods", return_period_list)
+    groups, codes = return_period_groups(return_period_list, len(columns["damage"]))
+    exceedance_probability = exceedance_probabilities(groups)
+    totals = band_losses(columns["damage"], columns["insurance_coverage"], codes, len(groups))
+
+    stream_sizes = [
+        min(sequences_per_stream, n_sequences - start)
+        for start in range(0, n_sequences, sequences_per_stream)
+    ]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(stream_sizes))
+    tasks = [
+        (exceedance_probability, totals, size, n_years, seed_sequence)
+        for size, seed_sequence in zip(stream_sizes, seed_sequences)
+    ]
+    if processes == 1:
+        streams = [simulate_stream(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            streams = list(executor.map(simulate_stream, tasks))
+
+    annual_loss = np.concatenate([stream["total"] for stream in streams])
+    annual_insured = np.concatenate([stream["insured"] for stream in streams])
+    horizon_loss = annual_loss.sum(axis=1)
+
+    total_loss = annual_loss.sum()
+    return {
+        "annual_loss": annual_loss,
+        "annual_insured_loss": annual_insured,
+        "mean_annual_loss": annual_loss.mean(),
+        "annual_loss_quantiles": dict(zip(quantiles, np.quantile(annual_loss, quantiles))),
+        "horizon_loss_quantiles": dict(zip(quantiles, np.quantile(horizon_loss, quantiles))),
+        "insured_share": annual_insured.sum() / total_loss if total_loss > 0 else float('nan'),
+        "uninsured_share": 1 - annual_insured.sum() / total_loss if total_loss > 0 else float('nan'),
+        "expected_annual_loss_analytic": expected_band_loss(totals["total"], groups),
+    }
+
+
+def expected_band_loss(band_total, return_period_list):
+    # mean of the banded annual loss, which simulate_seasons converges to; band_total is
+    # (R + 1,) or (G, R + 1) for (R,) or (G, R) return periods
+    band, no_event = band_probabilities(return_period_list)
+    return float(np.sum(band * np.asarray(band_total)[..., :-1]))
+
+
+def household_loss_quantiles(damage, return_period_list, quantiles=(0.9, 0.99)):
+    # exact per-household annual-loss quantiles of the banded distribution, (H, Q);
+    # return_period_list is (R,) or (H, R)
+    damage = np.asarray(damage, dtype=float)
+    band, no_event = band_probabilities(return_period_list)
+    losses = np.hstack([np.zeros((len(damage), 1)), damage])
+    probability = np.broadcast_to(
+        np.concatenate([np.asarray(no_event)[..., None], band], axis=-1), losses.shape
+    )
+    order = np.argsort(losses, axis=1, kind="stable")
+    sorted_losses = np.take_along_axis(losses, order, axis=1)
+    cumulative = np.cumsum(np.take_along_axis(probability, order, axis=1), axis=1)
+    result = np.empty((len(damage), len(quantiles)))
+    for j, q in enumerate(quantiles):
+        position = np.minimum((cumulative < q).sum(axis=1), losses.shape[1] - 1)
+        result[:, j] = sorted_losses[np.arange(len(damage)), position]
+    return result
@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+
+import agent
+import parameters
+import vectorized
+
+categorical_columns = [
+    "mortgage",
+    "income",
+    "race",
+    "ownership",
+    "property_flood_zone",
+    "building_type",
+]
+numeric_columns = ["property_height", "BFE", "area", "house_value"]
+
+
+class household_population:
+    # Structure-of-arrays store for every household of a model: one typed NumPy column
+    # per attribute, categoricals as integer codes, and the per-step results.
+    def __init__(self, unique_id, columns, categories):
+        self.unique_id = unique_id
+        self.columns = columns
+        self.categories = categories
+        self.interest_rate = None
+        self.loan_length = None
+        # what the cached pi column was computed for, see probability_weights
+        self.pi_key = None
+
+    @classmethod
+    def from_dataframe(
+            cls,
+            structure_dataframe,
+            flood_elevations,
+            initial_EAD,
+            max_initial_EAD,
+    ):
+        n_households = len(structure_dataframe)
+        columns = {}
+        categories = {}
+        for name in categorical_columns:
+            codes, uniques = pd.factorize(structure_dataframe[name], use_na_sentinel=False)
+            columns[name] = codes.astype(np.int16)
+            categories[name] = np.asarray(uniques, dtype=object)
+        for name in numeric_columns:
+            columns[name] = structure_dataframe[name].to_numpy(dtype=float)
+        columns["flood_elevations"] = np.asarray(flood_elevations, dtype=float)
+        columns["public_risk_reduction"] = structure_dataframe[
+            "public_risk_reduction"
+        ].to_numpy(dtype=float)
+        columns["initial_EAD"] = np.asarray(initial_EAD, dtype=float).copy()
+
+        # derived indices are computed once per category and spread with the codes
+        def per_category(name, values):
+            return np.array([values(category) for category in categories[name]])[columns[name]]
+
+        columns["require_insurance"] = per_category(
+            "property_flood_zone", lambda zone: zone in agent.insurance_required_zones
+        ) & per_category(
+            "mortgage", lambda mortgage: mortgage == "Housing Units with a Mortgage"
+        )
+        columns["i_income"] = per_category(
+            "income", lambda income: agent.income_mapping.get(income, 0)
+        ).astype(float)
+        columns["income_value"] = per_category(
+            "income", lambda income: vectorized.income_values.get(income, 45000)
+        ).astype(float)
+        columns["i_race"] = per_category(
+            "race", lambda race: 1 if race == "Minority Population" else 0
+        ).astype(float)
+        columns["i_ownership"] = per_category(
+            "ownership", lambda ownership: 1 if ownership == "Owner-Occupied Housing Units" else 0
+        ).astype(float)
+        max_education_level = 24
+        columns["i_eduction"] = (
+                structure_dataframe["education"].to_numpy().astype(int) / max_education_level
+        )
+        columns["i_government"] = np.where(
+            columns["public_risk_reduction"] == 0,
+            0.5,
+            0.5 + columns["initial_EAD"] / max_initial_EAD * 1 / 2,
+        )
+
+        n_return_periods = columns["flood_elevations"].shape[1]
+        columns["PU"] = np.full(n_households, float(parameters.M))
+        columns["risk_perception"] = np.full(n_households, np.nan)
+        columns["PU_no_action"] = np.full(n_households, np.nan)
+        columns["EAD_no_action"] = np.full(n_households, np.nan)
+        columns["EAD"] = np.full(n_households, np.nan)
+        columns["elevation"] = np.full(n_households, np.nan)
+        columns["insurance_type"] = np.zeros(n_households, dtype=np.uint8)
+        columns["insurance_coverage"] = np.zeros(n_households)
+        columns["damage"] = np.full((n_households, n_return_periods), np.nan)
+        columns["evaluated_options"] = np.zeros(n_households, dtype=int)
+        columns["pruned_options"] = np.zeros(n_households, dtype=int)
+
+        return cls(
+            structure_dataframe["structure_id"].to_numpy(),
+            columns,
+            categories,
+        )
+
+    def __len__(self):
+        return len(self.unique_id)
+
+    def reset_decisions(self):
+        # results back to their from_dataframe values; the cached pi stays valid
+        columns = self.columns
+        columns["PU"][:] = parameters.M
+        for name in ["PU_no_action", "EAD_no_action", "EAD", "elevation", "damage"]:
+            columns[name][:] = np.nan
+        for name in ["insurance_type", "insurance_coverage", "evaluated_options", "pruned_options"]:
+            columns[name][:] = 0
+
+    def decision_inputs(self, rows=None):
+        # rows selects a subset of households, e.g. the ones whose inputs changed
+        columns = self.columns
+        if rows is None:
+            inputs = dict(columns)
+        else:
+            inputs = {name: column[rows] for name, column in columns.items()}
+        inputs["building_type"] = self.categories["building_type"][inputs["building_type"]]
+        inputs["property_flood_zone_categories"] = self.categories["property_flood_zone"]
+        return inputs
+
+    def probability_weights(self, return_period_list, table=None):
+        # Risk perception only depends on the static household attributes, the public
+        # protection and parameters.py, so pi is computed once for every household and
+        # reused by later steps until one of those changes.
+        if "return_periods" in self.columns:
+            # per-household return periods are fixed for the life of the store
+            return_period_list = self.columns["return_periods"]
+            return_period_key = "return_periods"
+        else:
+            return_period_key = tuple(return_period_list)
+        key = (
+            return_period_key,
+            parameters.a,
+            parameters.b,
+            parameters.c,
+            parameters.d,
+            parameters.e,
+            parameters.gamma,
+            id(table),
+        )
+        if self.pi_key != key:
+            inputs = self.decision_inputs()
+            risk_perception, pi = vectorized.probability_weights(inputs, return_period_list, table)
+            self.columns["risk_perception"] = risk_perception
+            self.columns["pi"] = pi
+            self.pi_key = key
+        return self.columns["pi"]
+
+    def apply_decision(self, decisions, rows=None):
+        columns = self.columns
+        self.interest_rate = decisions["interest_rate"]
+        self.loan_length = decisions["loan_length"]
+        if rows is None:
+            rows = slice(None)
+
+        columns["risk_perception"][rows] = decisions["risk_perception"]
+        columns["PU_no_action"][rows] = decisions["PU_no_action"]
+        columns["EAD_no_action"][rows] = decisions["EAD_no_action"]
+        columns["insurance_type"][rows] = 0
+        columns["insurance_coverage"][rows] = 0
+        columns["damage"][rows] = decisions["damage_no_action"]
+        columns["evaluated_options"][rows] = decisions["evaluated_options"]
+        columns["pruned_options"][rows] = decisions["pruned_options"]
+
+        if decisions["policy"] == "voucher":
+            columns["elevation"][rows] = decisions["elevation"]
+
+        chosen = np.arange(len(self))[rows][decisions["chosen"]]
+        for name in ["PU", "EAD", "damage", "elevation", "insurance_type", "insurance_coverage"]:
+            columns[name][chosen] = decisions[name][decisions["chosen"]]
+
+    def set_public_risk_reduction(self, public_risk_reduction, max_initial_EAD):
+        # returns the households whose protection changed
+        columns = self.columns
+        changed = columns["public_risk_reduction"] != public_risk_reduction
+        if changed.any():
+            self.pi_key = None
+        columns["public_risk_reduction"][:] = public_risk_reduction
+        columns["i_government"][:] = np.where(
+            columns["public_risk_reduction"] == 0,
+            0.5,
+            0.5 + columns["initial_EAD"] / max_initial_EAD * 1 / 2,
+        )
+        return changed
+
+    def get(self, name, row):
+        columns = self.columns
+        if name in self.categories:
+            return self.categories[name][columns[name][row]]
+        if name == "insurance_type":
+            return vectorized.insurance_types[columns[name][row]]
+        if name == "flood_elevation_list":
+            return columns["flood_elevations"][row].tolist()
+        if name == "damage_list":
+            return columns["damage"][row].tolist()
+        if name in ("interest_rate", "loan_length"):
+            return getattr(self, name)
+        if name not in columns:
+            raise AttributeError(name)
+        return columns[name][row].item()
+
+    def set(self, name, row, value):
+        columns = self.columns
+        if name in self.categories:
+            value = list(self.categories[name]).index(value)
+        elif name == "insurance_type":
+            value = vectorized.insurance_types.index(value)
+        elif name == "damage_list":
+            name = "damage"
+        elif name == "flood_elevation_list":
+            name = "flood_elevations"
+        columns[name][row] = value
+
+    def results_frame(self, step):
+        # same layout as datacollector.get_agent_vars_dataframe().reset_index()
+        columns = self.columns
+        return pd.DataFrame(
+            {
+                "Step": step,
+                "AgentID": self.unique_id,
+                "EAD": columns["EAD"],
+                "insurance_type": np.asarray(vectorized.insurance_types, dtype=object)[
+                    columns["insurance_type"]
+                ],
+                "insurance_coverage": columns["insurance_coverage"],
+                "elevation": columns["elevation"],
+                "damage_list": columns["damage"].tolist(),
+            }
+        )
@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+
+import functions
+import parameters
+import vectorized
+
+# Sea-level-rise projection of household decisions and EAD. Every structure's flood
+# elevations are shifted by the rise of each year and scenario (functions.SLR) and the
+# households decide as in model.decide, for all years x scenarios x households in batches.
+# A household's damages, and so its decision, only change with the shift once the
+# highest flood reaches the house: every shift that keeps it at or below the house gives
+# the same damages, so one option search covers all of them, and shifts shared by
+# several years or scenarios are searched once.
+
+# acceleration (m/yr^2) of the USACE low, intermediate and high curves, base year 1992
+slr_scenarios = {"low": 0.0, "intermediate": 2.71e-5, "high": 1.13e-4}
+base_year = 1992
+# the year flood_elevation_list describes, which gets no shift
+reference_year = 2025
+
+
+def flood_shifts(years, scenarios=slr_scenarios, base_year=base_year, reference_year=reference_year):
+    # (S, Y) rise of the flood elevations in feet since reference_year
+    elapsed = np.asarray(years, dtype=float)[None, :] - base_year
+    acceleration = np.asarray(list(scenarios.values()), dtype=float)[:, None]
+    rise = functions.SLR(elapsed, acceleration) - functions.SLR(reference_year - base_year, acceleration)
+    return rise / 0.3048
+
+
+def highest_flood(model, flood_elevations, return_periods):
+    # (H,) highest flood elevation any damage of the household is evaluated at
+    hazard = getattr(model, "hazard", None)
+    if hazard is None:
+        return flood_elevations.max(axis=1)
+    # the hazard curve also extrapolates past the rarest return period
+    depths, _ = hazard.depths(flood_elevations, return_periods)
+    return np.maximum(depths.max(axis=1), flood_elevations.max(axis=1))
+
+
+def first_changing_shift(model, unique_shifts):
+    # (H,) number of the sorted unique shifts that keep every flood at or below the house
+    columns = model.population.columns
+    flood_elevations = columns["flood_elevations"]
+    highest = highest_flood(
+        model, flood_elevations, columns.get("return_periods", model.return_period_list)
+    )
+    unchanged = np.zeros(len(flood_elevations), dtype=np.int64)
+    for shift in unique_shifts:
+        unchanged += (highest + shift - columns["property_height"]) <= 0
+    return unchanged
+
+
+def household_blocks(n_searches, max_rows):
+    # contiguous household ranges with about max_rows option searches each
+    ends = np.cumsum(n_searches)
+    blocks = []
+    start = 0
+    while start < len(n_searches):
+        offset = ends[start - 1] if start else 0
+        end = max(int(np.searchsorted(ends, offset + max_rows, side="right")), start + 1)
+        blocks.append((start, end))
+        start = end
+    return blocks
+
+
+def project(
+        model,
+        years=range(2025, 2101),
+        scenarios=slr_scenarios,
+        base_year=base_year,
+        reference_year=reference_year,
+        max_rows=200000,
+):
+    # model after agent_generation; returns (S, Y, H) EAD, EAD_no_action, elevation and
+    # insurance_type per scenario, year and household, and how many option searches ran.
+    # Every year is decided from scratch on that year's flood elevations.
+    population = model.population
+    population.probability_weights(model.return_period_list, model.pi_table)
+
+    years = np.asarray(list(years))
+    shifts = flood_shifts(years, scenarios, base_year, reference_year)
+    unique_shifts, shift_index = np.unique(shifts, return_inverse=True)
+    shift_index = shift_index.reshape(shifts.shape)
+    n_shifts = len(unique_shifts)
+    n_households = len(population)
+
+    unchanged = first_changing_shift(model, unique_shifts)
+    # the smallest shift stands for every unchanged one, each later shift is searched
+    n_searches = (unchanged > 0) + (n_shifts - unchanged)
+
+    shape = shifts.shape + (n_households,)
+    result = {
+        "EAD": np.empty(shape, dtype=np.float32),
+        "EAD_no_action": np.empty(shape, dtype=np.float32),
+        "elevation": np.empty(shape, dtype=np.float32),
+        "insurance_type": np.empty(shape, dtype=np.uint8),
+    }
+    with model.profiler.stage("projection"):
+        for start, end in household_blocks(n_searches, max_rows):
+            shift_number = np.arange(n_shifts)[None, :]
+            block_unchanged = unchanged[start:end, None]
+            searched = (shift_number == 0) | (shift_number >= block_unchanged)
+            households, searched_shifts = np.nonzero(searched)
+            # search of every (household, shift): the first one while nothing changes
+            position = np.cumsum(searched.ravel()).reshape(searched.shape) - 1
+            search = np.take_along_axis(
+                position,
+                np.where(shift_number < block_unchanged, 0, shift_number),
+                axis=1,
+            )
+
+            inputs = population.decision_inputs(start + households)
+            inputs["flood_elevations"] = (
+                    inputs["flood_elevations"] + unique_shifts[searched_shifts][:, None]
+            )
+            # every searched row decides from scratch, as model.decide does for dirty rows
+            inputs["PU"] = np.full(len(households), float(parameters.M))
+            decisions = vectorized.household_decisions(model, inputs)
+            chosen = decisions["chosen"]
+            outcome = {
+                "EAD": np.where(chosen, decisions["EAD"], decisions["EAD_no_action"]),
+                "EAD_no_action": decisions["EAD_no_action"],
+                "elevation": (
+                    decisions["elevation"] if decisions["policy"] == "voucher"
+                    else np.where(chosen, decisions["elevation"], 0)
+                ),
+                "insurance_type": np.where(chosen, decisions["insurance_type"], 0),
+            }
+            # (block, S, Y) -> (S, Y, block)
+            lookup = search[:, shift_index]
+            for name, values in outcome.items():
+                result[name][:, :, start:end] = np.moveaxis(values[lookup], 0, -1)
+
+    result["years"] = years
+    result["scenarios"] = list(scenarios)
+    result["shifts"] = shifts
+    result["option_searches"] = int(n_searches.sum())
+    result["household_years"] = int(shifts.size * n_households)
+    return result
+
+
+def tract_trajectories(model, result, tract_column="GEOID"):
+    # one row per scenario, year and tract with household counts and sums
+    codes, tracts = pd.factorize(model.structure_dataframe[tract_column], use_na_sentinel=False)
+    n_scenarios, n_years, _ = result["EAD"].shape
+    n_tracts = len(tracts)
+
+    def sums(values):
+        # (S * Y * T,) one bincount per scenario and year
+        values = values.reshape(n_scenarios * n_years, -1)
+        return np.concatenate([
+            np.bincount(codes, np.nan_to_num(row.astype(np.float64)), minlength=n_tracts) for row in values
+        ])
+
+    return pd.DataFrame({
+        "scenario": np.repeat(result["scenarios"], n_years * n_tracts),
+        "year": np.tile(np.repeat(result["years"], n_tracts), n_scenarios),
+        "shift_ft": np.repeat(result["shifts"].ravel(), n_tracts),
+        tract_column: np.tile(np.asarray(tracts), n_scenarios * n_years),
+        "households": np.tile(np.bincount(codes, minlength=n_tracts), n_scenarios * n_years),
+        "total_EAD": sums(result["EAD"]),
+        "total_EAD_no_action": sums(result["EAD_no_action"]),
+        "elevated_households": sums(result["elevation"] > 0).astype(np.int64),
+        "insured_households": sums(result["insurance_type"] > 0).astype(np.int64),
+    })
+
+
+def household_trajectories(model, result, scenario):
+    # (Y, H) EAD of one scenario as a DataFrame, one column per household
+    s = result["scenarios"].index(scenario)
+    return pd.DataFrame(
+        result["EAD"][s], index=pd.Index(result["years"], name="year"), columns=model.population.unique_id
+    )
+
+
+def check_current_decisions(model, rtol=1e-6):
+    # project without any shift must reproduce the decisions the model holds after a
+    # step; returns the number of mismatching households per output, raises on any
+    if model.dirty.any():
+        raise ValueError("model has households to re-decide, call model.step() first")
+    result = project(model, years=[reference_year], scenarios={"current": 0.0})
+    columns = model.population.columns
+    # households that kept no action have no EAD of a chosen option
+    expected_EAD = np.where(np.isnan(columns["EAD"]), columns["EAD_no_action"], columns["EAD"])
+    expected = {
+        "EAD": expected_EAD,
+        "EAD_no_action": columns["EAD_no_action"],
+        "elevation": np.nan_to_num(columns["elevation"]),
+        "insurance_type": columns["insurance_type"],
+    }
+    mismatches = {}
+    for name, values in expected.items():
+        projected = result[name][0, 0].astype(np.float64)
+        values = np.asarray(values, dtype=np.float32).astype(np.float64)
+        mismatches[name] = int((~np.isclose(projected, values, rtol=rtol, atol=0, equal_nan=True)).sum())
+    if any(mismatches.values()):
+        raise ValueError("projection without a shift differs from the model: {}".format(mismatches))
+    return mismatches
+
+
+if __name__ == "__main__":
+    import synthetic
+    from model import adaptation_simulation
+
+    for policy in ["pre_FIRM", "voucher"]:
+        simulation_model = adaptation_simulation(
+            structure_dataframe=synthetic.generate_structures(5000, seed=0),
+            return_period_list=[5.886, 13.734, 24.7212, 61.803, 200],
+            policy=policy,
+            CRS_rewards=0.25,
+            covered_census_tracts=10,
+            risk_reduction_percentage=0.25,
+            agent_views=False,
+        )
+        simulation_model.agent_generation()
+        simulation_model.step()
+        simulation_model.step()
+        print(policy, check_current_decisions(simulation_model))
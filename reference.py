@@ -0,0 +1,167 @@
+import numpy as np
+import numpy_financial as npf
+import pandas as pd
+
+import functions
+import parameters
+import vectorized
+from model import adaptation_simulation
+
+# Scalar reference path: the original per-household decision loop, one
+# functions.prospect_utility_action call per option, on a row of model.population.
+# check_equivalence runs it next to the batched engine (vectorized.household_decisions,
+# as stepped by the model): the chosen option must be identical, and PU, EAD and damages
+# equal up to rtol, as the two paths differ by a few ulp (NumPy's power and the array
+# evaluation order are not Python's).
+
+
+def scalar_decision(model, row):
+    # first decision of one household, as the per-agent step made it before the model
+    # was batched
+    population = model.population
+
+    def get(name):
+        return population.get(name, row)
+
+    return_period_list = (
+        population.columns["return_periods"][row].tolist()
+        if "return_periods" in population.columns else model.return_period_list
+    )
+    flood_elevation_list = get("flood_elevation_list")
+    property_height = get("property_height")
+    risk_perception = functions.risk_perception(
+        get("i_income"), get("i_race"), get("i_eduction"), get("i_ownership"), get("i_government")
+    )
+
+    def prospect_utility(house_elevation, total_annual_cost, coverage):
+        return functions.prospect_utility_action(
+            flood_elevation_list,
+            return_period_list,
+            house_elevation,
+            get("building_type"),
+            risk_perception,
+            total_annual_cost,
+            get("house_value"),
+            coverage,
+            get("public_risk_reduction"),
+            False,
+        )
+
+    PU_no_action, EAD_no_action, damage_list = prospect_utility(property_height, 0, 0)
+    decision = {
+        "PU": parameters.M,
+        "chosen": False,
+        "EAD": np.nan,
+        "EAD_no_action": EAD_no_action,
+        "PU_no_action": PU_no_action,
+        "elevation": np.nan,
+        "insurance_type": "No insurance",
+        "insurance_coverage": 0,
+        "damage": damage_list,
+    }
+
+    def consider(PU, EAD, damage_list, elevation, insurance_type, coverage):
+        if PU < decision["PU"]:
+            decision.update(
+                PU=PU, chosen=True, EAD=EAD, damage=damage_list, elevation=elevation,
+                insurance_type=insurance_type, insurance_coverage=coverage,
+            )
+
+    if model.policy == "voucher":
+        estimated_elevation = max(0, get("BFE") - property_height + 1)
+        decision["elevation"] = estimated_elevation
+        annual_elevation_cost = -npf.pmt(0.03, 30, functions.elevation_cost(estimated_elevation, get("area")))
+        building_rate, contents_rate = functions.insurance_rate(
+            "NFIP",
+            get("property_flood_zone"),
+            estimated_elevation + property_height - get("BFE"),
+            model.CRS_rewards,
+        )
+        income_cap = get("income_value") / 12 * 0.05
+        for coverage in model.NFIP_coverage_options:
+            total_annual_cost = coverage / 100 * building_rate + annual_elevation_cost
+            if total_annual_cost > income_cap:
+                total_annual_cost = income_cap
+            PU, EAD, damage_list = prospect_utility(
+                property_height + estimated_elevation, total_annual_cost, coverage
+            )
+            consider(PU, EAD, damage_list, estimated_elevation, "NFIP", coverage)
+        return decision
+
+    for elevation in model.elevation_options:
+        annual_elevation_cost = -npf.pmt(0.04, 20, functions.elevation_cost(elevation, get("area")))
+        new_property_height = property_height + elevation
+        for insurance_type in ["NFIP", "private"]:
+            building_rate, contents_rate = functions.insurance_rate(
+                insurance_type,
+                get("property_flood_zone"),
+                new_property_height - get("BFE"),
+                model.CRS_rewards,
+            )
+            coverage_options = list(
+                model.NFIP_coverage_options if insurance_type == "NFIP" else model.private_coverage_options
+            )
+            if not get("require_insurance"):
+                coverage_options.append(0)
+            for coverage in coverage_options:
+                total_annual_cost = coverage * building_rate / 100 + annual_elevation_cost
+                PU, EAD, damage_list = prospect_utility(new_property_height, total_annual_cost, coverage)
+                consider(PU, EAD, damage_list, elevation, insurance_type, coverage)
+    return decision
+
+
+def check_equivalence(
+        path="structures_data_processing/data/data_for_simulation.csv",
+        policies=("pre_FIRM", "voucher"),
+        return_period_list=(5.886, 13.734, 24.7212, 61.803, 200),
+        rtol=1e-13,
+):
+    # number of households whose batched first-step decision differs from the scalar
+    # reference, per policy and output; raises on any mismatch. rtol=1e-13 is about 450
+    # ulp, above the few tens of ulp the paths differ by on the sample data.
+    structure_dataframe = pd.read_csv(path, header=0)
+    keep = (structure_dataframe["education"].notna()) & (structure_dataframe["property_flood_zone"] != 'OPEN')
+    structure_dataframe = structure_dataframe[keep].reset_index(drop=True)
+
+    mismatches = {}
+    for policy in policies:
+        model = adaptation_simulation(
+            structure_dataframe=structure_dataframe,
+            return_period_list=list(return_period_list),
+            policy=policy,
+            CRS_rewards=0.25,
+            covered_census_tracts=10,
+            risk_reduction_percentage=0.25,
+            agent_views=False,
+        )
+        model.agent_generation()
+        model.step()
+
+        expected = pd.DataFrame([scalar_decision(model, row) for row in range(len(model.population))])
+        columns = model.population.columns
+        batched_type = np.asarray(vectorized.insurance_types, dtype=object)[columns["insurance_type"]]
+
+        def differ(batched, scalar):
+            return int((~np.isclose(batched, scalar.to_numpy(dtype=float), rtol=rtol, atol=0, equal_nan=True)).sum())
+
+        mismatches[policy] = {
+            "chosen": int((~np.isnan(columns["EAD"]) != expected["chosen"].to_numpy()).sum()),
+            "PU": differ(columns["PU"], expected["PU"]),
+            "EAD": differ(columns["EAD"], expected["EAD"]),
+            "EAD_no_action": differ(columns["EAD_no_action"], expected["EAD_no_action"]),
+            "PU_no_action": differ(columns["PU_no_action"], expected["PU_no_action"]),
+            "elevation": differ(columns["elevation"], expected["elevation"]),
+            "insurance_type": int((batched_type != expected["insurance_type"].to_numpy()).sum()),
+            "insurance_coverage": differ(columns["insurance_coverage"], expected["insurance_coverage"]),
+            "damage": int((~np.isclose(
+                columns["damage"], np.array(expected["damage"].tolist(), dtype=float),
+                rtol=rtol, atol=0, equal_nan=True,
+            )).any(axis=1).sum()),
+        }
+    if any(count for counts in mismatches.values() for count in counts.values()):
+        raise ValueError("batched decisions differ from the scalar reference: {}".format(mismatches))
+    return mismatches
+
+
+if __name__ == "__main__":
+    print(check_equivalence())
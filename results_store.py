@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import vectorized
+
+# Results live in one directory: structures.parquet holds the static structure
+# attributes once, and every scenario file holds only the compact per-agent outputs in
+# the same row order. Parquet is columnar, so readers can load only the columns they need.
+# Writing and reading need pyarrow (pip install pyarrow).
+
+compression = "zstd"
+
+
+def scenario_name(policy, covered_census_tracts, CRS_rewards=0.25, risk_reduction_percentage=0.25):
+    # every parameter of sweep.scenario_grid, so that no two scenarios share a file
+    return "result_{}_{}_CRS{:g}_risk{:g}".format(
+        policy, covered_census_tracts, CRS_rewards, risk_reduction_percentage
+    )
+
+
+def damage_columns(n_return_periods):
+    return ["damage_{}".format(i) for i in range(n_return_periods)]
+
+
+def write_structures(structure_dataframe, directory="data/results"):
+    os.makedirs(directory, exist_ok=True)
+    structure_dataframe.reset_index(drop=True).to_parquet(
+        os.path.join(directory, "structures.parquet"), compression=compression, index=False
+    )
+
+
+def compact_result(result):
+    # typed scenario columns from a population.results_frame / datacollector frame
+    compact = pd.DataFrame(
+        {
+            "structure_id": result["AgentID"].to_numpy(),
+            "EAD": result["EAD"].to_numpy(dtype=np.float64),
+            "insurance_type": pd.Categorical(
+                result["insurance_type"], categories=vectorized.insurance_types
+            ),
+            "insurance_coverage": result["insurance_coverage"].to_numpy(dtype=np.float32),
+            "elevation": result["elevation"].to_numpy(dtype=np.float32),
+        }
+    )
+    if "public_risk_reduction" in result:
+        compact["public_risk_reduction"] = result["public_risk_reduction"].to_numpy(dtype=np.float32)
+    damage = np.array(result["damage_list"].tolist(), dtype=np.float32)
+    for i, name in enumerate(damage_columns(damage.shape[1])):
+        compact[name] = damage[:, i]
+    return compact
+
+
+def write_scenario(
+        result,
+        policy,
+        covered_census_tracts,
+        directory="data/results",
+        CRS_rewards=0.25,
+        risk_reduction_percentage=0.25,
+):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory,
+        scenario_name(policy, covered_census_tracts, CRS_rewards, risk_reduction_percentage) + ".parquet",
+    )
+    compact_result(result).to_parquet(path, compression=compression, index=False)
+    return path
+
+
+def read_structures(directory="data/results", columns=None):
+    return pd.read_parquet(os.path.join(directory, "structures.parquet"), columns=columns)
+
+
+def read_scenario(
+        policy,
+        covered_census_tracts,
+        directory="data/results",
+        columns=None,
+        structure_columns=None,
+        CRS_rewards=0.25,
+        risk_reduction_percentage=0.25,
+):
+    # columns picks scenario outputs, structure_columns adds static attributes by row order
+    result = pd.read_parquet(
+        os.path.join(
+            directory,
+            scenario_name(policy, covered_census_tracts, CRS_rewards, risk_reduction_percentage) + ".parquet",
+        ),
+        columns=columns,
+    )
+    if structure_columns:
+        structures = read_structures(directory, structure_columns)
+        result = pd.concat([structures, result], axis=1)
+    return result
@@ -0,0 +1,167 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+
+import parameters
+import vectorized
+
+# Sensitivity of the adaptation outcome to the behavioural parameters of parameters.py.
+# Damages, EAD and option costs do not depend on these parameters, so the option tensor
+# is built once per model and every parameter sample only re-weights it.
+
+parameter_names = ["a", "b", "c", "d", "e", "gamma", "expected_utility_parameter"]
+output_names = ["elevated_share", "insured_share", "mean_EAD"]
+
+default_bounds = {
+    "a": (0.5 * parameters.a, 1.5 * parameters.a),
+    "b": (0.5 * parameters.b, 1.5 * parameters.b),
+    "c": (0.5 * parameters.c, 1.5 * parameters.c),
+    "d": (0.5 * parameters.d, 1.5 * parameters.d),
+    "e": (0.5 * parameters.e, 1.5 * parameters.e),
+    "gamma": (0.4, 1.0),
+    "expected_utility_parameter": (0.25, 1.0),
+}
+
+shared_state = {}
+
+
+def baseline_parameters():
+    return np.array([getattr(parameters, name) for name in parameter_names], dtype=float)
+
+
+def scale_samples(unit_samples, bounds):
+    lower = np.array([bounds[name][0] for name in parameter_names], dtype=float)
+    upper = np.array([bounds[name][1] for name in parameter_names], dtype=float)
+    return qmc.scale(unit_samples, lower, upper)
+
+
+def latin_hypercube_design(n_samples, bounds=None, seed=0):
+    bounds = default_bounds if bounds is None else bounds
+    sampler = qmc.LatinHypercube(d=len(parameter_names), seed=seed)
+    return scale_samples(sampler.random(n_samples), bounds)
+
+
+def sobol_design(n_samples, bounds=None, seed=0):
+    # Saltelli design: base matrices A and B, and for every parameter i the matrix AB_i
+    # that is A with column i taken from B. n_samples should be a power of two.
+    bounds = default_bounds if bounds is None else bounds
+    k = len(parameter_names)
+    sampler = qmc.Sobol(d=2 * k, scramble=True, seed=seed)
+    base = sampler.random(n_samples)
+    A = scale_samples(base[:, :k], bounds)
+    B = scale_samples(base[:, k:], bounds)
+    AB = np.repeat(A[None, :, :], k, axis=0)
+    for i in range(k):
+        AB[i, :, i] = B[:, i]
+    return A, B, AB
+
+
+def evaluate_sample(options, inputs, return_period_list, sample):
+    # one parameter vector (a, b, c, d, e, gamma, expected_utility_parameter) -> outputs,
+    # every household deciding from scratch as in the first model step
+    risk_perception = vectorized.risk_perception_array(inputs, sample[:5])
+    pi = vectorized.pi_array(risk_perception, return_period_list, sample[5])
+    current_PU = np.full(len(pi), float(parameters.M))
+    decisions = vectorized.choose_options(options, pi, current_PU, sample[6])
+
+    chosen = decisions["chosen"]
+    EAD = np.where(chosen, decisions["EAD"], decisions["EAD_no_action"])
+    return (
+        np.mean(chosen & (decisions["elevation"] > 0)),
+        np.mean(chosen & (decisions["insurance_type"] > 0)),
+        np.mean(EAD),
+    )
+
+
+def init_worker(options, inputs, return_period_list):
+    shared_state["options"] = options
+    shared_state["inputs"] = inputs
+    shared_state["return_period_list"] = return_period_list
+
+
+def evaluate_chunk(samples):
+    return np.array([
+        evaluate_sample(
+            shared_state["options"],
+            shared_state["inputs"],
+            shared_state["return_period_list"],
+            sample,
+        )
+        for sample in samples
+    ]).reshape(-1, len(output_names))
+
+
+def evaluate_samples(model, samples, processes=1, chunk_size=256):
+    # (N, P) parameter samples -> (N, O) outputs for a model whose agents are generated
+    samples = np.atleast_2d(np.asarray(samples, dtype=float))
+    inputs = model.population.decision_inputs()
+    options = vectorized.decision_options(model, inputs)
+    chunks = [samples[start:start + chunk_size] for start in range(0, len(samples), chunk_size)]
+    # (H, R) per-tract return periods when the model has them
+    return_period_list = inputs.get("return_periods", model.return_period_list)
+
+    init_worker(options, inputs, return_period_list)
+    if processes == 1:
+        outputs = [evaluate_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(
+                max_workers=processes,
+                initializer=init_worker,
+                initargs=(options, inputs, return_period_list),
+        ) as executor:
+            outputs = list(executor.map(evaluate_chunk, chunks))
+    return np.concatenate(outputs) if outputs else np.empty((0, len(output_names)))
+
+
+def latin_hypercube_study(model, n_samples, bounds=None, seed=0, processes=1):
+    # samples, outputs and their shift from the parameters.py baseline, one row per sample
+    samples = latin_hypercube_design(n_samples, bounds, seed)
+    outputs = evaluate_samples(model, np.vstack([baseline_parameters(), samples]), processes)
+    baseline, outputs = outputs[0], outputs[1:]
+
+    study = pd.DataFrame(samples, columns=parameter_names)
+    for j, name in enumerate(output_names):
+        study[name] = outputs[:, j]
+        study[name + "_shift"] = outputs[:, j] - baseline[j]
+    return study
+
+
+def sobol_indices(f_A, f_B, f_AB):
+    # first-order (Saltelli 2010) and total (Jansen) estimators for one output,
+    # f_A and f_B of shape (N,), f_AB of shape (P, N)
+    variance = np.var(np.concatenate([f_A, f_B]))
+    if variance == 0:
+        nan = np.full(len(f_AB), np.nan)
+        return nan, nan
+    first_order = np.mean(f_B * (f_AB - f_A), axis=1) / variance
+    total = 0.5 * np.mean((f_A - f_AB) ** 2, axis=1) / variance
+    return first_order, total
+
+
+def sobol_study(model, n_samples=1024, bounds=None, seed=0, processes=1):
+    # n_samples * (P + 2) model evaluations; returns the Sobol indices per output and the
+    # mean shift of every output from the parameters.py baseline
+    A, B, AB = sobol_design(n_samples, bounds, seed)
+    k = len(parameter_names)
+    samples = np.vstack([baseline_parameters(), A, B, AB.reshape(-1, k)])
+    outputs = evaluate_samples(model, samples, processes)
+    baseline = outputs[0]
+    f_A = outputs[1:n_samples + 1]
+    f_B = outputs[n_samples + 1:2 * n_samples + 1]
+    f_AB = outputs[2 * n_samples + 1:].reshape(k, n_samples, -1)
+
+    indices = {}
+    shift = {}
+    for j, name in enumerate(output_names):
+        first_order, total = sobol_indices(f_A[:, j], f_B[:, j], f_AB[:, :, j])
+        indices[name] = pd.DataFrame(
+            {"S1": first_order, "ST": total}, index=pd.Index(parameter_names, name="parameter")
+        )
+        shift[name] = {
+            "baseline": baseline[j],
+            "mean": np.concatenate([f_A[:, j], f_B[:, j]]).mean(),
+            "mean_shift": np.concatenate([f_A[:, j], f_B[:, j]]).mean() - baseline[j],
+        }
+    return {"indices": indices, "shift": shift, "n_evaluations": len(samples)}
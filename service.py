@@ -0,0 +1,210 @@
+import argparse
+import json
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+import cache
+from model import adaptation_simulation, scenario_invariant_state
+
+# Long-lived scenario service. The structure file, the flood matrix and the no-action
+# EAD are loaded once, one warm model per policy keeps its population store between
+# requests, and each request only moves the public protection and CRS discount, lets every
+# household decide again and summarizes the result. Repeated parameter sets come from an
+# LRU cache.
+#
+#   python service.py --port 8765
+#   curl "http://127.0.0.1:8765/scenario?policy=voucher&covered_census_tracts=10&CRS_rewards=0.25&risk_reduction_percentage=0.25"
+
+return_period_list = [5.886, 13.734, 24.7212, 61.803, 200]
+policies = ["pre_FIRM", "voucher"]
+
+
+class simulation_service:
+    def __init__(
+            self,
+            structure_dataframe,
+            return_period_list=return_period_list,
+            flood_elevations=None,
+            tract_return_periods=None,
+            cache_size=256,
+    ):
+        self.structure_dataframe = structure_dataframe.reset_index(drop=True)
+        self.return_period_list = return_period_list
+        self.tract_return_periods = tract_return_periods
+        self.invariant_state = scenario_invariant_state(
+            self.structure_dataframe, return_period_list, flood_elevations, tract_return_periods
+        )
+        self.tract_codes, self.tracts = pd.factorize(
+            self.structure_dataframe['GEOID'], use_na_sentinel=False
+        )
+        self.models = {}
+        self.cache_size = cache_size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_csv(cls, source_path, cache_dir="data/cache", **kwargs):
+        structure_dataframe, flood_elevations = cache.load_structures(source_path, cache_dir)
+        # same filter as simulation.py
+        keep = (structure_dataframe["education"].notna()) & (structure_dataframe["property_flood_zone"] != 'OPEN')
+        return cls(
+            structure_dataframe[keep],
+            flood_elevations=flood_elevations[keep.to_numpy()],
+            **kwargs,
+        )
+
+    def warm_model(self, policy, CRS_rewards, covered_census_tracts, risk_reduction_percentage):
+        if policy not in self.models:
+            simulation_model = adaptation_simulation(
+                structure_dataframe=self.structure_dataframe.copy(),
+                return_period_list=self.return_period_list,
+                policy=policy,
+                CRS_rewards=CRS_rewards,
+                covered_census_tracts=covered_census_tracts,
+                risk_reduction_percentage=risk_reduction_percentage,
+                invariant_state=self.invariant_state,
+                agent_views=False,
+                tract_return_periods=self.tract_return_periods,
+            )
+            simulation_model.agent_generation()
+            self.models[policy] = simulation_model
+            return simulation_model
+
+        simulation_model = self.models[policy]
+        simulation_model.set_CRS_rewards(CRS_rewards)
+        simulation_model.set_public_protection(covered_census_tracts, risk_reduction_percentage)
+        simulation_model.reset_decisions()
+        return simulation_model
+
+    def run(self, policy, covered_census_tracts, CRS_rewards=0.25, risk_reduction_percentage=0.25):
+        if policy not in policies:
+            raise ValueError("policy must be one of {}".format(policies))
+        key = (policy, int(covered_census_tracts), float(CRS_rewards), float(risk_reduction_percentage))
+        if key in self.results:
+            self.hits += 1
+            self.results.move_to_end(key)
+            return self.results[key]
+        self.misses += 1
+
+        simulation_model = self.warm_model(policy, key[2], key[1], key[3])
+        simulation_model.decide()
+        result = {
+            "scenario": dict(zip(
+                ["policy", "covered_census_tracts", "CRS_rewards", "risk_reduction_percentage"], key
+            )),
+            **self.summarize(simulation_model),
+        }
+
+        self.results[key] = result
+        if len(self.results) > self.cache_size:
+            self.results.popitem(last=False)
+        return result
+
+    def summarize(self, simulation_model):
+        columns = simulation_model.population.columns
+        codes = self.tract_codes
+        n_tracts = len(self.tracts)
+        EAD = np.nan_to_num(columns['EAD'])
+        EAD_no_action = np.nan_to_num(columns['EAD_no_action'])
+        elevated = columns['elevation'] > 0
+        insured = columns['insurance_type'] > 0
+
+        households = np.bincount(codes, minlength=n_tracts)
+        tract_EAD = np.bincount(codes, EAD, minlength=n_tracts)
+        tracts = pd.DataFrame({
+            "GEOID": self.tracts.astype(str),
+            "households": households,
+            "total_EAD": tract_EAD,
+            "mean_EAD": tract_EAD / np.maximum(households, 1),
+            "total_EAD_no_action": np.bincount(codes, EAD_no_action, minlength=n_tracts),
+            "elevated_households": np.bincount(codes, elevated, minlength=n_tracts).astype(int),
+            "insured_households": np.bincount(codes, insured, minlength=n_tracts).astype(int),
+            "public_risk_reduction": np.bincount(
+                codes, columns['public_risk_reduction'], minlength=n_tracts
+            ) / np.maximum(households, 1),
+        })
+        return {
+            "summary": {
+                "households": int(len(codes)),
+                "total_EAD": float(EAD.sum()),
+                "total_EAD_no_action": float(EAD_no_action.sum()),
+                "elevated_households": int(elevated.sum()),
+                "NFIP_households": int((columns['insurance_type'] == 1).sum()),
+                "private_households": int((columns['insurance_type'] == 2).sum()),
+                "covered_census_tracts": list(map(str, simulation_model.top_census_tracts)),
+            },
+            "tracts": tracts.to_dict(orient="records"),
+        }
+
+    def status(self):
+        return {
+            "households": int(len(self.structure_dataframe)),
+            "warm_policies": list(self.models),
+            "cached_results": len(self.results),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+        }
+
+
+def request_handler(service):
+    class handler(BaseHTTPRequestHandler):
+        def send_json(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            if url.path == "/status":
+                self.send_json(200, service.status())
+            elif url.path == "/scenario":
+                try:
+                    result = service.run(
+                        query.get("policy", "pre_FIRM"),
+                        int(query.get("covered_census_tracts", 0)),
+                        float(query.get("CRS_rewards", 0.25)),
+                        float(query.get("risk_reduction_percentage", 0.25)),
+                    )
+                except ValueError as error:
+                    self.send_json(400, {"error": str(error)})
+                else:
+                    self.send_json(200, result)
+            else:
+                self.send_json(404, {"error": "unknown path {}".format(url.path)})
+
+    return handler
+
+
+def serve(service, host="127.0.0.1", port=8765):
+    # one request at a time: the warm models are shared state
+    server = HTTPServer((host, port), request_handler(service))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="data/full_data_for_simulation.csv")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=256)
+    arguments = parser.parse_args()
+
+    scenario_service = simulation_service.from_csv(arguments.data, cache_size=arguments.cache_size)
+    for policy_name in policies:
+        scenario_service.warm_model(policy_name, 0.25, 0, 0.25)
+    print("serving {} households on http://{}:{}".format(
+        len(scenario_service.structure_dataframe), arguments.host, arguments.port
+    ))
+    serve(scenario_service, arguments.host, arguments.port)
@@ -0,0 +1,135 @@
+import os
+from ast import literal_eval
+
+import numpy as np
+import pandas as pd
+
+import population
+import vectorized
+from model import adaptation_simulation, household_return_periods
+
+
+# Chunk-by-chunk execution for structure files that do not fit in memory. Only the
+# tract ranking needs a global pass, and it only needs per-tract EAD sums and counts,
+# so peak memory is one chunk plus one row per census tract.
+
+
+def usable_structures(chunk):
+    # same filter as simulation.py
+    return (chunk["education"].notna()) & (chunk["property_flood_zone"] != 'OPEN')
+
+
+def read_chunks(source_path, chunksize, row_filter=usable_structures):
+    for chunk in pd.read_csv(source_path, header=0, chunksize=chunksize):
+        if row_filter is not None:
+            chunk = chunk[row_filter(chunk)]
+        if len(chunk) == 0:
+            continue
+        flood_elevations = np.array(
+            [literal_eval(flood_elevation_list) for flood_elevation_list in chunk['flood_elevation_list']],
+            dtype=float,
+        )
+        yield chunk.reset_index(drop=True), flood_elevations
+
+
+def tract_statistics(
+        source_path,
+        return_period_list,
+        chunksize=100000,
+        row_filter=usable_structures,
+        tract_return_periods=None,
+):
+    tract_sums = None
+    for chunk, flood_elevations in read_chunks(source_path, chunksize, row_filter):
+        initial_EAD = vectorized.initial_EAD_batch(
+            flood_elevations,
+            household_return_periods(chunk, return_period_list, tract_return_periods),
+            chunk['property_height'],
+            chunk['building_type'],
+            chunk['house_value'],
+        )
+        chunk_sums = pd.DataFrame({'GEOID': chunk['GEOID'], 'initial_EAD': initial_EAD}).groupby(
+            'GEOID').agg(EAD_sum=('initial_EAD', 'sum'), count=('initial_EAD', 'count'))
+        tract_sums = chunk_sums if tract_sums is None else tract_sums.add(chunk_sums, fill_value=0)
+
+    # same ranking as adaptation_simulation.agent_generation, from the streamed sums
+    tract_sums = tract_sums.sort_index()
+    census_dataframe = pd.DataFrame({
+        'GEOID': tract_sums.index,
+        'initial_EAD': (tract_sums['EAD_sum'] / tract_sums['count']).to_numpy(),
+        'count': tract_sums['count'].to_numpy(dtype=int),
+    }).sort_values(by='initial_EAD', ascending=False)
+    return {
+        'census_dataframe': census_dataframe,
+        'max_initial_EAD': census_dataframe['initial_EAD'].iloc[0],
+    }
+
+
+def run_streaming(
+        source_path,
+        output_path,
+        return_period_list,
+        policy,
+        CRS_rewards,
+        covered_census_tracts,
+        risk_reduction_percentage,
+        chunksize=100000,
+        row_filter=usable_structures,
+        tract_return_periods=None,
+):
+    # tract_return_periods: RP table indexed by GEOID as in adaptation_simulation
+    statistics = tract_statistics(
+        source_path, return_period_list, chunksize, row_filter, tract_return_periods
+    )
+    top_census_tracts = statistics['census_dataframe'].head(covered_census_tracts)['GEOID'].to_list()
+
+    # the model only carries the scenario settings and option lists here
+    simulation_model = adaptation_simulation(
+        structure_dataframe=None,
+        return_period_list=return_period_list,
+        policy=policy,
+        CRS_rewards=CRS_rewards,
+        covered_census_tracts=covered_census_tracts,
+        risk_reduction_percentage=risk_reduction_percentage,
+        tract_return_periods=tract_return_periods,
+        agent_views=False,
+    )
+    simulation_model.census_dataframe = statistics['census_dataframe']
+    simulation_model.max_initial_EAD = statistics['max_initial_EAD']
+    simulation_model.top_census_tracts = top_census_tracts
+
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    n_households = 0
+    for chunk, flood_elevations in read_chunks(source_path, chunksize, row_filter):
+        return_periods = household_return_periods(chunk, return_period_list, tract_return_periods)
+        chunk['initial_EAD'] = vectorized.initial_EAD_batch(
+            flood_elevations,
+            return_periods,
+            chunk['property_height'],
+            chunk['building_type'],
+            chunk['house_value'],
+        )
+        chunk['public_risk_reduction'] = np.where(
+            chunk['GEOID'].isin(top_census_tracts), risk_reduction_percentage, 0.0
+        )
+
+        chunk_population = population.household_population.from_dataframe(
+            chunk,
+            flood_elevations,
+            chunk['initial_EAD'],
+            statistics['max_initial_EAD'],
+        )
+        if np.ndim(return_periods) == 2:
+            chunk_population.columns['return_periods'] = return_periods
+        decisions = vectorized.household_decisions(
+            simulation_model, chunk_population.decision_inputs()
+        )
+        chunk_population.apply_decision(decisions)
+
+        result_df = pd.concat([chunk, chunk_population.results_frame(1)], axis=1)
+        result_df.to_csv(output_path, mode='a', header=n_households == 0, index=False)
+        n_households += len(chunk)
+
+    return statistics
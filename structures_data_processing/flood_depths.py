@@ -0,0 +1,283 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import rasterio
+import shapely
+from rasterio.warp import transform as transform_points
+from rasterio.windows import Window
+
+# Flood-depth assignment of assign_flood_depths.ipynb as a reusable module for millions
+# of structures. Points are sorted by the raster block they fall in, only those blocks
+# are read (one window per block, never the whole raster), every layer on the same grid
+# is sampled in the same pass, and groups of blocks are spread over processes.
+
+slosh_layers = [
+    "us_Category1_SLOSH_Projected",
+    "us_Category2_SLOSH_Projected",
+    "us_Category3_SLOSH_Projected",
+    "us_Category4_SLOSH_Projected",
+    "us_Category5_SLOSH_Projected",
+]
+# cells without data carry huge values: 1.79e308 in the FEMA rasters, 255 in SLOSH
+missing_above = {"BFE": 1.0e02, "500yrDepth": 1.0e02, "SLOSH": 250}
+# SLOSH cells inside a levee zone, which have no flood data
+levee_value = 99
+
+# datasets opened once per process
+shared_state = {}
+
+
+def geodatabase_layer(geodatabase_path, layer_name):
+    return "OpenFileGDB:{}:{}".format(geodatabase_path, layer_name)
+
+
+def raster_grid(path):
+    with rasterio.open(path) as src:
+        return {
+            "crs": src.crs,
+            "transform": src.transform,
+            "width": src.width,
+            "height": src.height,
+            "block_shape": src.block_shapes[0],
+        }
+
+
+def grid_key(grid):
+    return (
+        grid["crs"].to_string() if grid["crs"] else None,
+        tuple(grid["transform"]),
+        grid["width"],
+        grid["height"],
+        grid["block_shape"],
+    )
+
+
+def pixel_indices(grid, xs, ys):
+    cols, rows = ~grid["transform"] * (np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+    rows = np.floor(rows).astype(np.int64)
+    cols = np.floor(cols).astype(np.int64)
+    inside = (rows >= 0) & (rows < grid["height"]) & (cols >= 0) & (cols < grid["width"])
+    return rows, cols, inside
+
+
+def block_tasks(grid, rows, cols, inside, points_per_task):
+    # lists of (block_row, block_col, point indices), about points_per_task points each
+    block_height, block_width = grid["block_shape"]
+    n_block_cols = -(-grid["width"] // block_width)
+    points = np.flatnonzero(inside)
+    block = (rows[points] // block_height) * n_block_cols + cols[points] // block_width
+    order = np.argsort(block, kind="stable")
+    points = points[order]
+    block = block[order]
+    starts = np.flatnonzero(np.r_[True, block[1:] != block[:-1]])
+    ends = np.r_[starts[1:], len(block)]
+
+    tasks = []
+    task = []
+    task_points = 0
+    for start, end in zip(starts, ends):
+        block_row, block_col = divmod(int(block[start]), n_block_cols)
+        task.append((block_row, block_col, points[start:end]))
+        task_points += end - start
+        if task_points >= points_per_task:
+            tasks.append(task)
+            task = []
+            task_points = 0
+    if task:
+        tasks.append(task)
+    return tasks
+
+
+def open_dataset(path):
+    datasets = shared_state.setdefault("datasets", {})
+    if path not in datasets:
+        datasets[path] = rasterio.open(path)
+    return datasets[path]
+
+
+def close_datasets():
+    for dataset in shared_state.pop("datasets", {}).values():
+        dataset.close()
+
+
+def init_worker(paths, grid, rows, cols):
+    shared_state["paths"] = paths
+    shared_state["grid"] = grid
+    shared_state["rows"] = rows
+    shared_state["cols"] = cols
+
+
+def sample_blocks(task):
+    # (point indices, (n, L) values) for the blocks of one task, one window read per
+    # block and layer
+    paths = shared_state["paths"]
+    grid = shared_state["grid"]
+    rows = shared_state["rows"]
+    cols = shared_state["cols"]
+    block_height, block_width = grid["block_shape"]
+    datasets = [open_dataset(path) for path in paths]
+
+    indices = np.concatenate([points for _, _, points in task])
+    values = np.empty((len(indices), len(paths)))
+    position = 0
+    for block_row, block_col, points in task:
+        row_off = block_row * block_height
+        col_off = block_col * block_width
+        window = Window(
+            col_off,
+            row_off,
+            min(block_width, grid["width"] - col_off),
+            min(block_height, grid["height"] - row_off),
+        )
+        local_rows = rows[points] - row_off
+        local_cols = cols[points] - col_off
+        for j, dataset in enumerate(datasets):
+            data = dataset.read(1, window=window)
+            values[position:position + len(points), j] = data[local_rows, local_cols]
+        position += len(points)
+    return indices, values
+
+
+def sample_layers(
+        paths,
+        xs,
+        ys,
+        points_crs=None,
+        processes=1,
+        points_per_task=200000,
+        fill_value=np.nan,
+):
+    # (N, L) values of every raster in paths at the points; layers sharing a grid are
+    # read together. Points outside a raster get fill_value.
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    values = np.full((len(xs), len(paths)), fill_value, dtype=float)
+
+    groups = {}
+    for j, path in enumerate(paths):
+        grid = raster_grid(path)
+        groups.setdefault(grid_key(grid), (grid, []))[1].append(j)
+
+    for grid, layer_indices in groups.values():
+        grid_xs, grid_ys = xs, ys
+        if points_crs is not None and grid["crs"] is not None and grid["crs"] != points_crs:
+            grid_xs, grid_ys = (np.asarray(a) for a in transform_points(points_crs, grid["crs"], xs, ys))
+        rows, cols, inside = pixel_indices(grid, grid_xs, grid_ys)
+        tasks = block_tasks(grid, rows, cols, inside, points_per_task)
+        layer_paths = [paths[j] for j in layer_indices]
+        initargs = (layer_paths, grid, rows, cols)
+
+        if processes == 1:
+            init_worker(*initargs)
+            try:
+                results = [sample_blocks(task) for task in tasks]
+            finally:
+                close_datasets()
+        else:
+            with ProcessPoolExecutor(
+                    max_workers=processes, initializer=init_worker, initargs=initargs
+            ) as executor:
+                results = list(executor.map(sample_blocks, tasks))
+
+        for indices, block_values in results:
+            values[indices[:, None], np.asarray(layer_indices)] = block_values
+    return values
+
+
+def structure_coordinates(structures, x="x", y="y"):
+    if x in structures and y in structures:
+        return structures[x].to_numpy(dtype=float), structures[y].to_numpy(dtype=float)
+    points = shapely.from_wkt(structures["geometry"].astype(str).to_numpy())
+    coordinates = shapely.get_coordinates(points)
+    return coordinates[:, 0], coordinates[:, 1]
+
+
+def depth_lists(depths):
+    # "[1, 4, 10, 15, 19]" as in full_data_for_simulation.csv
+    if np.all(depths == np.round(depths)):
+        depths = depths.astype(np.int64)
+    return [str(row) for row in depths.tolist()]
+
+
+def assign_flood_depths(
+        structures,
+        BFE_path,
+        depth_500yr_path,
+        slosh_paths,
+        x="x",
+        y="y",
+        points_crs=None,
+        processes=1,
+        points_per_task=200000,
+        drop_levee=True,
+):
+    # structures with BFE, 500yrDepth, SLOSH_depths and flood_elevation_list; x/y in
+    # points_crs (the raster CRS when None), or WKT points in geometry. As in the
+    # notebook, structures with a levee cell (99) in their SLOSH depths are dropped;
+    # drop_levee=False keeps them with 99 in their flood list.
+    xs, ys = structure_coordinates(structures, x, y)
+    values = sample_layers(
+        [BFE_path, depth_500yr_path] + list(slosh_paths),
+        xs,
+        ys,
+        points_crs,
+        processes,
+        points_per_task,
+    )
+
+    BFE = values[:, 0]
+    BFE[~(BFE <= missing_above["BFE"])] = 0
+    depth_500yr = values[:, 1]
+    depth_500yr[~(depth_500yr <= missing_above["500yrDepth"])] = 0
+    slosh = values[:, 2:]
+    slosh[~(slosh <= missing_above["SLOSH"])] = 0
+
+    result = structures.copy()
+    result["BFE"] = BFE
+    result["500yrDepth"] = depth_500yr
+    result["SLOSH_depths"] = depth_lists(slosh)
+    result["flood_elevation_list"] = result["SLOSH_depths"]
+    if drop_levee:
+        result = result[~(slosh == levee_value).any(axis=1)]
+    return result
+
+
+def write_test_raster(path, data, transform, crs="EPSG:2278", nodata=None, blocksize=256):
+    # tiled single-band GeoTIFF, e.g. for checking assign_flood_depths against known values
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = np.asarray(data)
+    with rasterio.open(
+            path,
+            "w",
+            driver="GTiff",
+            width=data.shape[1],
+            height=data.shape[0],
+            count=1,
+            dtype=data.dtype,
+            crs=crs,
+            transform=transform,
+            nodata=nodata,
+            tiled=True,
+            blockxsize=blocksize,
+            blockysize=blocksize,
+    ) as dst:
+        dst.write(data, 1)
+    return path
+
+
+if __name__ == "__main__":
+    geodatabase_path = r"C:\Users\kb42628\Documents\ArcGIS\Projects\FEMA_BFE_data\FEMA_BFE_data.gdb"
+    structures_df = pd.read_csv("data/full_structures_data_no_flood_depths.csv")
+    flood_depths = assign_flood_depths(
+        structures_df,
+        geodatabase_layer(geodatabase_path, "GalCo_BFE_merged"),
+        geodatabase_layer(geodatabase_path, "GalCo_500yr_DEP_merged"),
+        [geodatabase_layer(geodatabase_path, layer) for layer in slosh_layers],
+        points_crs="EPSG:4326",
+        processes=None,
+    )
+    flood_depths.to_csv("data/full_structures_data_all_flood_depths.csv", index=False)
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely import STRtree
+
+# Hurricane strike counts and return periods of hurricane_RP_calcs.ipynb for many
+# analysis points at once. One STRtree over the IBTrACS track segments answers every
+# "within strike distance" query in a single batched call; per point and storm only the
+# record with the highest wind counts, with its SSHS category.
+
+strike_distance = 92600  # 50 nautical miles, in meters
+record_years = 123.606  # Jan 1, 1901 to Aug 20, 2024
+metric_crs = "epsg:3081"  # NAD83 / Texas State Mapping System, meters
+categories = [0, 1, 2, 3, 4, 5]  # tropical storm, hurricane categories 1-5
+
+
+def strike_counts(tracks, points, distance=strike_distance):
+    # (P, 6) number of storms whose strongest record within distance of each point was
+    # a tropical storm (0) or a category 1-5 hurricane; tracks and points in metric_crs
+    tracks = tracks.reset_index(drop=True)
+    tree = STRtree(tracks.geometry.values)
+    point_index, segment_index = tree.query(
+        np.asarray(points.geometry.values), predicate="dwithin", distance=distance
+    )
+
+    hits = pd.DataFrame({
+        "point": point_index,
+        "segment": segment_index,
+        "SID": tracks["SID"].to_numpy()[segment_index],
+        "USA_WIND": tracks["USA_WIND"].to_numpy()[segment_index],
+        "SSHS": tracks["SSHS_clean"].to_numpy()[segment_index],
+    })
+    # highest wind per point and storm, the first such segment on ties
+    hits = hits.sort_values(
+        ["point", "SID", "USA_WIND", "segment"], ascending=[True, True, False, True]
+    ).drop_duplicates(["point", "SID"])
+    hits = hits[hits["SSHS"].isin(categories)]
+
+    counts = np.zeros((len(points), len(categories)), dtype=np.int64)
+    np.add.at(counts, (hits["point"].to_numpy(), hits["SSHS"].to_numpy(dtype=int)), 1)
+    return counts
+
+
+def return_periods(counts, years=record_years, max_return_period=None):
+    # RP_k = years / storms of category k or stronger; (P, 6) for RP0..RP5, inf without
+    # any such storm unless capped at max_return_period
+    at_least = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1]
+    with np.errstate(divide="ignore"):
+        periods = years / at_least
+    if max_return_period is not None:
+        periods = np.minimum(periods, max_return_period)
+    return periods
+
+
+def point_return_periods(
+        tracks,
+        points,
+        distance=strike_distance,
+        years=record_years,
+        max_return_period=None,
+):
+    # strike counts (Cat0..Cat5) and return periods (RP0..RP5) per analysis point
+    tracks = tracks.to_crs(metric_crs)
+    points = points.to_crs(metric_crs)
+    counts = strike_counts(tracks, points, distance)
+    periods = return_periods(counts, years, max_return_period)
+    result = pd.DataFrame(index=points.index)
+    for k in categories:
+        result["Cat{}".format(k)] = counts[:, k]
+    for k in categories:
+        result["RP{}".format(k)] = periods[:, k]
+    return result
+
+
+def tract_return_periods(
+        tracks,
+        tracts,
+        distance=strike_distance,
+        years=record_years,
+        max_return_period=None,
+        columns=("RP1", "RP2", "RP3", "RP4", "RP5"),
+):
+    # RP1..RP5 per census tract centroid, indexed by GEOID, the table
+    # adaptation_simulation(tract_return_periods=...) takes
+    centroids = gpd.GeoDataFrame(
+        {"GEOID": tracts["GEOID"].astype(str).to_numpy()},
+        geometry=tracts.to_crs(metric_crs).geometry.centroid.values,
+        crs=metric_crs,
+    ).set_index("GEOID")
+    result = point_return_periods(tracks, centroids, distance, years, max_return_period)
+    return result[list(columns)]
+
+
+if __name__ == "__main__":
+    tracks = gpd.read_file('data/hurricane_track_data/IBTrACS_NA_20240819_SSHSclean_1901.shp')
+    year = 2020
+    tracts = gpd.read_file(
+        "https://www2.census.gov/geo/tiger/TIGER{}/TRACT/tl_{}_48_tract.zip".format(year, year)
+    )
+    tracts = tracts[tracts["COUNTYFP"].isin(["167", "201"])]  # Galveston and Harris
+    # the region-wide list in simulation.py caps the missing category 5 return period at 200 years
+    tract_return_periods(tracks, tracts, max_return_period=200).to_csv('data/tract_hurricaneRPs.csv')
@@ -0,0 +1,87 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from model import adaptation_simulation, scenario_invariant_state
+
+# state shared by every scenario of a sweep, set once per worker process
+shared_state = {}
+
+
+def scenario_grid(
+        policy=("pre_FIRM", "voucher"),
+        CRS_rewards=(0.25,),
+        covered_census_tracts=(0,),
+        risk_reduction_percentage=(0.25,),
+):
+    return [
+        {
+            "policy": policy_name,
+            "CRS_rewards": CRS_reward,
+            "covered_census_tracts": census_tract_number,
+            "risk_reduction_percentage": risk_reduction,
+        }
+        for census_tract_number, policy_name, CRS_reward, risk_reduction in itertools.product(
+            covered_census_tracts, policy, CRS_rewards, risk_reduction_percentage
+        )
+    ]
+
+
+def init_worker(structure_dataframe, return_period_list, invariant_state, tract_return_periods=None):
+    shared_state["structure_dataframe"] = structure_dataframe
+    shared_state["return_period_list"] = return_period_list
+    shared_state["invariant_state"] = invariant_state
+    shared_state["tract_return_periods"] = tract_return_periods
+
+
+def run_scenario(scenario):
+    simulation_model = adaptation_simulation(
+        structure_dataframe=shared_state["structure_dataframe"].copy(),
+        return_period_list=shared_state["return_period_list"],
+        invariant_state=shared_state["invariant_state"],
+        tract_return_periods=shared_state["tract_return_periods"],
+        agent_views=False,
+        **scenario,
+    )
+    simulation_model.agent_generation()
+    simulation_model.step()
+    if simulation_model.profiler.output_directory is not None:
+        simulation_model.profiler.export("profile_{}_{}".format(
+            "_".join(str(value) for value in scenario.values()), os.getpid()
+        ))
+
+    result = simulation_model.population.results_frame(simulation_model.schedule.steps)
+    # keep the scenario-dependent inputs next to the agent results
+    result = result.merge(
+        simulation_model.structure_dataframe[
+            ["structure_id", "initial_EAD", "public_risk_reduction"]
+        ],
+        left_on="AgentID",
+        right_on="structure_id",
+        how="left",
+    ).drop(columns="structure_id")
+    return scenario, result
+
+
+def run_sweep(
+        structure_dataframe,
+        return_period_list,
+        scenarios,
+        processes=None,
+        flood_elevations=None,
+        tract_return_periods=None,
+):
+    # processes=None uses every core, processes=1 runs in this process
+    invariant_state = scenario_invariant_state(
+        structure_dataframe, return_period_list, flood_elevations, tract_return_periods
+    )
+    initargs = (structure_dataframe, return_period_list, invariant_state, tract_return_periods)
+
+    if processes == 1:
+        init_worker(*initargs)
+        return [run_scenario(scenario) for scenario in scenarios]
+
+    with ProcessPoolExecutor(
+            max_workers=processes, initializer=init_worker, initargs=initargs
+    ) as executor:
+        return list(executor.map(run_scenario, scenarios))
@@ -0,0 +1,195 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Synthetic structure files with the schema of data/full_data_for_simulation.csv, for
+# testing the model at sizes the 438-row Galveston sample cannot reach. Marginal
+# distributions follow that sample (structures_data_processing/data/data_for_simulation.csv):
+# continuous columns are drawn from its deciles, categories from its shares, and
+# structures are grouped into census tracts of very different sizes that share a location,
+# a social vulnerability index, a minority share and a surge offset.
+
+columns = [
+    "structure_id", "property_flood_zone", "property_height", "BFE", "area", "building_type",
+    "house_value", "mortgage", "income", "race", "education", "ownership",
+    "flood_elevation_list", "SVI", "geometry", "500yrDepth", "SLOSH_depths", "x", "y",
+    "index_right", "GEOID",
+]
+
+zone_shares = {"AE": 0.80, "VE": 0.19, "AO": 0.005, "A": 0.005}
+
+# (min, 10th, 20th, ..., 90th percentile, max) of the sample
+property_height_deciles = {
+    "AE": [1.2, 4.74, 5.0, 6.99, 8.05, 8.8, 9.71, 10.69, 11.89, 13.75, 36.4],
+    "VE": [1.2, 3.49, 4.62, 4.99, 5.04, 5.6, 7.1, 8.14, 9.11, 10.01, 20.0],
+}
+BFE_deciles = {
+    "AE": [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.4, 0.6, 0.9, 1.4, 5.3],
+    "VE": [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.08, 2.0],
+}
+area_deciles = [516, 988, 1220, 1355, 1495, 1656, 1951, 2215, 2668, 3384, 22400]
+house_value_deciles = [
+    36711, 97441, 121110, 149693, 174097, 188267, 204014, 239469, 268521, 336801, 2637615,
+]
+education_deciles = [1, 15.9, 16, 17, 18, 19, 19, 20, 21, 22, 24]
+# flood elevation (ft) of every return period, ascending return periods
+flood_deciles = [
+    [0, 0, 0, 0, 0, 0, 2, 2, 3, 4, 8],
+    [0, 0, 2, 2, 3, 4, 6, 6, 7, 8, 12],
+    [2, 5, 7, 8, 9, 10, 11, 11, 12, 13, 17],
+    [10, 13, 14, 14, 15, 16, 17, 17, 18, 20, 24],
+    [14, 17, 18, 19, 20, 21, 21, 21, 21, 21, 26],
+]
+
+income_shares = {
+    "Income Below $45,000": 136,
+    "Households with Income $45,000 - $49,999": 17,
+    "Households with Income $50,000 - $59,999": 31,
+    "Households with Income $60,000 - $74,999": 37,
+    "Households with Income $75,000 - $99,999": 48,
+    "Households with Income $100,000 - $124,999": 35,
+    "Households with Income $125,000 - $149,999": 29,
+    "Households with Income $150,000 - $199,999": 48,
+    "Households with Income $200,000 or more": 57,
+}
+mortgage_share = 226 / 436
+mortgage_missing_share = 2 / 438
+minority_share = 165 / 438
+owner_share = 323 / 438
+
+# Galveston County, Texas (state plane feet)
+x_range = (3169000.0, 3408000.0)
+y_range = (13607000.0, 13770000.0)
+tract_spread = 3000.0
+
+
+def decile_sample(rng, deciles, size):
+    # inverse CDF through the decile table
+    return np.interp(rng.random(size), np.linspace(0, 1, len(deciles)), deciles)
+
+
+def choice(rng, shares, size):
+    names = list(shares)
+    probability = np.array([shares[name] for name in names], dtype=float)
+    return np.asarray(names, dtype=object)[
+        rng.choice(len(names), size=size, p=probability / probability.sum())
+    ]
+
+
+def generate_tracts(n_tracts, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "GEOID": ["48167{:06d}".format(720000 + 100 * i) for i in range(n_tracts)],
+        "index_right": np.arange(n_tracts),
+        # a few large tracts and many small ones, as in the sample
+        "weight": rng.lognormal(0.0, 1.0, n_tracts),
+        "x": rng.uniform(*x_range, n_tracts),
+        "y": rng.uniform(*y_range, n_tracts),
+        "SVI": np.round(rng.beta(1.2, 2.0, n_tracts), 4),
+        "minority_share": rng.beta(2.0, 2.0 * (1 - minority_share) / minority_share, n_tracts),
+        "surge_offset": rng.normal(0.0, 1.0, n_tracts),
+    })
+
+
+def generate_structures(n_structures, seed=0, tracts=None, first_id=480000000):
+    rng = np.random.default_rng(seed)
+    if tracts is None:
+        tracts = generate_tracts(max(60, n_structures // 2000), seed)
+    tract = rng.choice(len(tracts), size=n_structures, p=tracts["weight"] / tracts["weight"].sum())
+
+    zone = choice(rng, zone_shares, n_structures)
+    coastal = zone == "VE"
+    property_height = np.where(
+        coastal,
+        decile_sample(rng, property_height_deciles["VE"], n_structures),
+        decile_sample(rng, property_height_deciles["AE"], n_structures),
+    )
+    BFE = np.round(np.where(
+        coastal,
+        decile_sample(rng, BFE_deciles["VE"], n_structures),
+        decile_sample(rng, BFE_deciles["AE"], n_structures),
+    ), 1)
+
+    # one quantile per structure for every return period, so flood levels stay ordered,
+    # pushed up for coastal structures and shifted by the tract surge offset
+    quantile = rng.random(n_structures)
+    quantile = np.where(coastal, 1 - (1 - quantile) ** 1.5, quantile)
+    offset = tracts["surge_offset"].to_numpy()[tract]
+    flood_elevations = np.stack(
+        [
+            np.interp(quantile, np.linspace(0, 1, len(deciles)), deciles) + offset
+            for deciles in flood_deciles
+        ],
+        axis=1,
+    )
+    flood_elevations = np.maximum.accumulate(np.clip(np.round(flood_elevations), 0, None), axis=1)
+    flood_elevations = flood_elevations.astype(int)
+    # written like the sample, e.g. "[0, 2, 8, 15, 21]"
+    flood_lists = "[" + pd.Series(flood_elevations[:, 0]).astype(str)
+    for i in range(1, flood_elevations.shape[1]):
+        flood_lists = flood_lists + ", " + pd.Series(flood_elevations[:, i]).astype(str)
+    flood_lists = flood_lists + "]"
+
+    mortgage = np.where(
+        rng.random(n_structures) < mortgage_share,
+        "Housing Units with a Mortgage",
+        "Housing Units without a Mortgage",
+    ).astype(object)
+    mortgage[rng.random(n_structures) < mortgage_missing_share] = np.nan
+
+    x = tracts["x"].to_numpy()[tract] + rng.normal(0.0, tract_spread, n_structures)
+    y = tracts["y"].to_numpy()[tract] + rng.normal(0.0, tract_spread, n_structures)
+
+    return pd.DataFrame({
+        "structure_id": first_id + np.arange(n_structures),
+        "property_flood_zone": zone,
+        "property_height": property_height,
+        "BFE": BFE,
+        "area": np.round(decile_sample(rng, area_deciles, n_structures)),
+        "building_type": "residential",
+        "house_value": np.round(decile_sample(rng, house_value_deciles, n_structures), 4),
+        "mortgage": mortgage,
+        "income": choice(rng, income_shares, n_structures),
+        "race": np.where(
+            rng.random(n_structures) < tracts["minority_share"].to_numpy()[tract],
+            "Minority Population",
+            "Non-Minority Population",
+        ),
+        "education": np.round(decile_sample(rng, education_deciles, n_structures)),
+        "ownership": np.where(
+            rng.random(n_structures) < owner_share,
+            "Owner-Occupied Housing Units",
+            "Renter-Occupied Housing Units",
+        ),
+        "flood_elevation_list": flood_lists,
+        "SVI": tracts["SVI"].to_numpy()[tract],
+        "geometry": "POINT (" + pd.Series(x).astype(str) + " " + pd.Series(y).astype(str) + ")",
+        # not used by the model, a rough depth proxy to keep the schema
+        "500yrDepth": np.round(np.clip(flood_elevations[:, -1] - property_height - 10, 0, None) / 2, 1),
+        "SLOSH_depths": flood_lists,
+        "x": x,
+        "y": y,
+        "index_right": tracts["index_right"].to_numpy()[tract],
+        "GEOID": tracts["GEOID"].to_numpy()[tract],
+    }, columns=columns)
+
+
+def write_structures(path, n_structures, seed=0, chunksize=500000):
+    # chunk by chunk, so files of any size can be written; the output depends on
+    # seed and chunksize
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tracts = generate_tracts(max(60, n_structures // 2000), seed)
+    chunk_seeds = np.random.SeedSequence(seed).spawn(-(-n_structures // chunksize))
+    for i, chunk_seed in enumerate(chunk_seeds):
+        start = i * chunksize
+        chunk = generate_structures(
+            min(chunksize, n_structures - start),
+            chunk_seed,
+            tracts,
+            first_id=480000000 + start,
+        )
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return path
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+
+import parameters
+import vectorized
+
+# Which census tracts to protect with a fixed budget so that total residual EAD, after
+# households respond, is smallest. A household's decision only depends on its own
+# tract's protection, so the EAD reduction of protecting a tract does not depend on which
+# other tracts are protected: one batched decision pass with every candidate open and one
+# with every candidate protected give every tract's gain at once, and the selection is a
+# knapsack over tracts. Applying the plan only re-solves households whose protection
+# changed.
+
+
+def tract_codes(model):
+    # integer tract per household (-1 without a GEOID) and the GEOIDs
+    return pd.factorize(model.structure_dataframe['GEOID'])
+
+
+def residual_EAD(model, rows):
+    # EAD each household in rows ends up with under the model's current protection:
+    # the chosen option's EAD, or the no-action EAD when no option beats no action
+    if len(rows) == 0:
+        return np.zeros(0)
+    model.population.probability_weights(model.return_period_list, model.pi_table)
+    inputs = model.population.decision_inputs(rows)
+    # decide from scratch as model.decide does for dirty rows; the stored PU of an earlier
+    # step would otherwise hide options that only tie it
+    inputs["PU"] = np.full(len(rows), float(parameters.M))
+    decisions = vectorized.household_decisions(model, inputs)
+    return np.nan_to_num(
+        np.where(decisions["chosen"], decisions["EAD"], decisions["EAD_no_action"])
+    )
+
+
+def tract_gains(model, candidates=None, risk_reduction_percentage=None):
+    # DataFrame indexed by GEOID with households, residual EAD unprotected and protected,
+    # and gain (the EAD reduction of protecting the tract); the model keeps its protection
+    codes, tracts = tract_codes(model)
+    if candidates is None:
+        candidate_codes = np.arange(len(tracts))
+    else:
+        candidate_codes = tracts.get_indexer(pd.Index(candidates))
+        candidate_codes = candidate_codes[candidate_codes >= 0]
+    if risk_reduction_percentage is None:
+        risk_reduction_percentage = model.risk_reduction_percentage
+
+    protected = list(model.top_census_tracts)
+    protection = model.risk_reduction_percentage
+    dirty = model.dirty.copy()
+    candidate_tracts = tracts[candidate_codes]
+    candidate_set = set(candidate_tracts)
+    others = [tract for tract in protected if tract not in candidate_set]
+    rows = np.flatnonzero(np.isin(codes, candidate_codes))
+    try:
+        model.protect_tracts(others, risk_reduction_percentage)
+        open_EAD = residual_EAD(model, rows)
+        model.protect_tracts(others + list(candidate_tracts), risk_reduction_percentage)
+        protected_EAD = residual_EAD(model, rows)
+    finally:
+        model.protect_tracts(protected, protection)
+        model.dirty[:] = dirty
+
+    n_tracts = len(tracts)
+    households = np.bincount(codes[rows], minlength=n_tracts)[candidate_codes]
+    open_total = np.bincount(codes[rows], open_EAD, minlength=n_tracts)[candidate_codes]
+    protected_total = np.bincount(codes[rows], protected_EAD, minlength=n_tracts)[candidate_codes]
+    return pd.DataFrame(
+        {
+            "households": households,
+            "EAD_unprotected": open_total,
+            "EAD_protected": protected_total,
+            "gain": open_total - protected_total,
+        },
+        index=pd.Index(candidate_tracts, name="GEOID"),
+    )
+
+
+def greedy_selection(gain, cost, budget):
+    # best gain per cost first, skipping tracts that no longer fit
+    selected = np.zeros(len(gain), dtype=bool)
+    remaining = budget
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(cost > 0, gain / cost, np.inf)
+    for i in np.argsort(-ratio, kind="stable"):
+        if gain[i] > 0 and cost[i] <= remaining:
+            selected[i] = True
+            remaining -= cost[i]
+    return selected
+
+
+def knapsack_selection(gain, cost, budget, cost_unit=None, max_units=10000):
+    # exact 0/1 knapsack over costs rounded up to cost_unit (default: budget / max_units)
+    if cost_unit is None:
+        cost_unit = budget / max_units if budget > 0 else 1.0
+    weights = np.ceil(np.asarray(cost, dtype=float) / cost_unit - 1e-9).astype(np.int64)
+    capacity = int(np.floor(budget / cost_unit + 1e-9))
+    items = np.flatnonzero((gain > 0) & (weights <= capacity))
+
+    best = np.zeros(capacity + 1)
+    taken = np.zeros((len(items), capacity + 1), dtype=bool)
+    for k, i in enumerate(items):
+        w = weights[i]
+        if w == 0:
+            best += gain[i]
+            taken[k] = True
+            continue
+        candidate = best[:-w] + gain[i]
+        better = candidate > best[w:]
+        taken[k, w:] = better
+        best[w:] = np.where(better, candidate, best[w:])
+
+    selected = np.zeros(len(gain), dtype=bool)
+    c = capacity
+    for k in range(len(items) - 1, -1, -1):
+        if taken[k, c]:
+            selected[items[k]] = True
+            c -= weights[items[k]]
+    return selected
+
+
+def optimize_targets(
+        model,
+        budget,
+        tract_costs=None,
+        method="knapsack",
+        candidates=None,
+        risk_reduction_percentage=None,
+        apply=True,
+        cost_unit=None,
+):
+    # tract_costs: Series indexed by GEOID (tracts without a cost are not candidates),
+    # None costs 1 per tract so budget is a number of tracts. With apply the model
+    # protects the chosen tracts and decides again, re-solving only affected households.
+    gains = tract_gains(model, candidates, risk_reduction_percentage)
+    # protected tracts outside the candidates stay protected
+    evaluated = set(gains.index)
+    others = [tract for tract in model.top_census_tracts if tract not in evaluated]
+    if tract_costs is None:
+        costs = pd.Series(1.0, index=gains.index)
+    else:
+        tract_costs = pd.Series(tract_costs)
+        tract_costs.index = tract_costs.index.astype(str)
+        costs = tract_costs.reindex(gains.index.astype(str))
+        costs.index = gains.index
+    gains = gains[costs.notna().to_numpy()].copy()
+    gains["cost"] = costs.dropna().to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gains["gain_per_cost"] = gains["gain"] / gains["cost"]
+
+    gain = gains["gain"].to_numpy()
+    cost = gains["cost"].to_numpy()
+    if method == "greedy":
+        gains["selected"] = greedy_selection(gain, cost, budget)
+    elif method == "knapsack":
+        gains["selected"] = knapsack_selection(gain, cost, budget, cost_unit)
+    else:
+        raise ValueError("method must be 'greedy' or 'knapsack'")
+
+    if apply:
+        selected = gains.index[gains["selected"].to_numpy()].to_list()
+        model.protect_tracts(others + selected, risk_reduction_percentage)
+        model.decide()
+    return gains.sort_values("gain_per_cost", ascending=False)
@@ -0,0 +1,788 @@
+import warnings
+
+import numpy as np
+import numpy_financial as npf
+
+import damage_curves
+import functions
+import instrumentation
+import parameters
+
+insurance_types = ["No insurance", "NFIP", "private"]
+
+# interest rate and loan length used to annualize the elevation cost of each policy
+loan_terms = {"voucher": (0.03, 30), "pre_FIRM": (0.04, 20)}
+
+income_values = {
+    "Income Below $45,000": 45000,
+    "Households with Income $45,000 - $49,999": 47500,
+    "Households with Income $50,000 - $59,999": 55000,
+    "Households with Income $60,000 - $74,999": 67500,
+    "Households with Income $75,000 - $99,999": 87500,
+    "Households with Income $100,000 - $124,999": 112500,
+    "Households with Income $125,000 - $149,999": 137500,
+    "Households with Income $150,000 - $199,999": 175000,
+    "Households with Income $200,000 or more": 200000,
+}
+
+
+# Array versions of the scalar helpers in functions.py. They are not bit-identical to
+# the scalar path: NumPy's power and the array evaluation order differ from Python's,
+# so PU and EAD agree to about 1 ulp and damages to a few tens of ulp (relative 1e-13,
+# see reference.check_equivalence).
+
+
+def positive(value):
+    # same as max(0, value), which keeps value only if it is strictly positive
+    return np.where(value > 0, value, 0.0)
+
+
+def damage_assessment_array(building_type, flood_elevation_feet):
+    # curves by building type from damage_curves.registry
+    return damage_curves.registry.evaluate(building_type, flood_elevation_feet)
+
+
+def elevation_cost_array(elevation, area):
+    elevation = np.asarray(elevation, dtype=float)
+    area = np.asarray(area, dtype=float)
+    return np.where(
+        elevation > 2,
+        (17 + (elevation - 2) * 0.75) * area,
+        np.where(elevation > 0, 17 * area, 0.0),
+    )
+
+
+def risk_perception_array(population, weights=None):
+    # weights (a, b, c, d, e) default to parameters.py
+    if weights is None:
+        return functions.risk_perception(
+            population["i_income"],
+            population["i_race"],
+            population["i_eduction"],
+            population["i_ownership"],
+            population["i_government"],
+        )
+    a, b, c, d, e = weights
+    return (
+                   a * population["i_income"]
+                   + b * population["i_race"]
+                   + c * population["i_eduction"]
+                   + d * population["i_ownership"]
+                   + e * population["i_government"]
+           ) / (a + b + c + d + e)
+
+
+def pi_array(risk_perception, return_period_list, gamma=None):
+    # (H,) risk perceptions x (R,) return periods -> (H, R) probability weights
+    if gamma is None:
+        gamma = parameters.gamma
+    risk_perception = np.asarray(risk_perception, dtype=float)[:, None]
+    probability = 1 / np.asarray(return_period_list, dtype=float)
+    core = np.minimum(1, 10 ** (2 * risk_perception - 1) * probability)
+    numerator = core ** gamma
+    denominator = (numerator + ((1 - core) ** gamma)) ** (
+            1 / gamma
+    )
+    return numerator / denominator
+
+
+class probability_weighting_table:
+    # pi_array tabulated over a risk-perception grid for bulk runs. lookup interpolates
+    # linearly per return period. pi has a kink where 10 ** (2r - 1) / T reaches 1: it is
+    # 1 above it and its slope is infinite just below it, so the kinks are grid points and
+    # a band below each kink is computed exactly. estimated_error is the largest deviation
+    # from pi_array outside the bands at the points of a grid check_factor times finer;
+    # the grid is refined until it is within tolerance and every band is at most max_band
+    # wide. It is an estimate, not a bound: between the check points the deviation can be
+    # slightly larger.
+    # Risk perceptions outside the grid are computed exactly.
+    def __init__(
+            self,
+            return_period_list,
+            gamma=None,
+            lower=0.0,
+            upper=1.0,
+            n_points=1025,
+            tolerance=1e-6,
+            check_factor=8,
+            max_points=(1 << 16) + 1,
+            max_band=0.05,
+    ):
+        self.return_period_list = list(return_period_list)
+        self.gamma = parameters.gamma if gamma is None else gamma
+        self.tolerance = tolerance
+        self.kinks = (1 + np.log10(np.asarray(self.return_period_list, dtype=float))) / 2
+        inside = (self.kinks > lower) & (self.kinks < upper)
+        while True:
+            spacing = (upper - lower) / (n_points - 1)
+            self.grid = np.union1d(np.linspace(lower, upper, n_points), self.kinks[inside])
+            self.values = pi_array(self.grid, self.return_period_list, self.gamma)
+            self.band_start = np.full(len(self.kinks), np.inf)
+            check = np.linspace(lower, upper, (n_points - 1) * check_factor + 1)
+            error = np.abs(self.interpolate(check) - pi_array(check, self.return_period_list, self.gamma))
+            for i in np.flatnonzero(inside):
+                failing = check[error[:, i] > tolerance]
+                # only a stretch right below the kink is left to the exact computation
+                if len(failing) and failing.max() <= self.kinks[i]:
+                    self.band_start[i] = max(failing.min() - spacing, lower)
+            banded = self.in_band(check)
+            self.estimated_error = float(np.max(np.where(banded, 0, error)))
+            self.band_width = float(np.max(np.where(inside, self.kinks - self.band_start, 0), initial=0))
+            if self.estimated_error <= tolerance and self.band_width <= max_band:
+                break
+            if 2 * n_points - 1 > max_points:
+                warnings.warn(
+                    "probability_weighting_table: estimated_error {:.3g} (tolerance {:.3g}) and exact band "
+                    "{:.3g} (max_band {:.3g}) with {} grid points".format(
+                        self.estimated_error, tolerance, self.band_width, max_band, len(self.grid)
+                    ),
+                    RuntimeWarning,
+                )
+                break
+            n_points = 2 * n_points - 1
+
+    def interpolate(self, risk_perception):
+        return np.stack(
+            [
+                np.interp(risk_perception, self.grid, self.values[:, i])
+                for i in range(self.values.shape[1])
+            ],
+            axis=-1,
+        )
+
+    def in_band(self, risk_perception):
+        # (H, R) whether a risk perception is in the exact band of a return period
+        risk_perception = np.asarray(risk_perception, dtype=float)[:, None]
+        return (risk_perception >= self.band_start) & (risk_perception <= self.kinks)
+
+    def check(self, return_period_list, gamma=None):
+        # the table only holds pi for the return periods and gamma it was built with
+        gamma = parameters.gamma if gamma is None else gamma
+        if list(return_period_list) != self.return_period_list or gamma != self.gamma:
+            raise ValueError(
+                "probability_weighting_table built for return periods {} and gamma {}, "
+                "used with {} and gamma {}; build a new table".format(
+                    self.return_period_list, self.gamma, list(return_period_list), gamma
+                )
+            )
+
+    def lookup(self, risk_perception):
+        risk_perception = np.asarray(risk_perception, dtype=float)
+        pi = self.interpolate(risk_perception)
+        outside = ~((risk_perception >= self.grid[0]) & (risk_perception <= self.grid[-1]))
+        exact = outside | self.in_band(risk_perception).any(axis=1)
+        if exact.any():
+            pi[exact] = pi_array(risk_perception[exact], self.return_period_list, self.gamma)
+        return pi
+
+
+def probability_weights(population, return_period_list, table=None):
+    # risk perception and the (H, R) pi of every household; pi is shared by all options.
+    # The table only holds the shared return periods, per-household ones are computed.
+    risk_perception = risk_perception_array(population)
+    if table is not None and np.ndim(return_period_list) == 1:
+        table.check(return_period_list)
+        return risk_perception, table.lookup(risk_perception)
+    return risk_perception, pi_array(risk_perception, return_period_list)
+
+
+def U_array(damage, expected_utility_parameter=None):
+    if expected_utility_parameter is None:
+        expected_utility_parameter = parameters.expected_utility_parameter
+    return damage ** expected_utility_parameter
+
+
+def return_period_array(return_period_list, ndim):
+    # (R,) return periods shared by everyone, or (H, R) per household reshaped to
+    # broadcast against an ndim array with households first and return periods last
+    return_period_list = np.asarray(return_period_list, dtype=float)
+    if return_period_list.ndim == 2:
+        return_period_list = return_period_list.reshape(
+            (return_period_list.shape[0],) + (1,) * (ndim - 2) + (return_period_list.shape[1],)
+        )
+    return return_period_list
+
+
+def EAD_array(damage, return_period_list):
+    # trapezoid over the last axis of damage, as in prospect_utility_action
+    return_period_list = return_period_array(return_period_list, damage.ndim)
+    if damage.shape[-1] > 1:
+        EAD = 0
+        for i in range(damage.shape[-1] - 1):
+            EAD += (
+                    1
+                    / 2
+                    * (damage[..., i] + damage[..., i + 1])
+                    * (1 / return_period_list[..., i] - 1 / return_period_list[..., i + 1])
+            )
+    else:
+        EAD = damage[..., 0] / return_period_list[..., 0]
+    return EAD
+
+
+def damage_batch(
+        flood_elevations,
+        house_elevation,
+        building_type,
+        house_value,
+        public_risk_reduction,
+):
+    # (H, R) flood elevations against (H, E) house elevations -> (H, E, R) damages
+    flood_height = positive(flood_elevations[:, None, :] - house_elevation[:, :, None])
+    damage_percentage = damage_assessment_array(building_type[:, None, None], flood_height)
+    return (
+            np.asarray(house_value)[:, None, None]
+            * damage_percentage
+            * (1 - np.asarray(public_risk_reduction)[:, None, None])
+    )
+
+
+def initial_EAD_batch(
+        flood_elevations,
+        return_period_list,
+        property_height,
+        building_type,
+        house_value,
+        hazard=None,
+):
+    # no-action EAD without public risk reduction, as prospect_utility_action(..., only_EAD=True);
+    # a hazard.hazard_curve integrates the continuous exceedance curve instead
+    house_elevation = np.asarray(property_height, dtype=float)[:, None]
+    building_type = np.asarray(building_type, dtype=object)
+    house_value = np.asarray(house_value, dtype=float)
+    public_risk_reduction = np.zeros(len(flood_elevations))
+    if hazard is not None:
+        return hazard.EAD(
+            flood_elevations,
+            return_period_list,
+            house_elevation,
+            building_type,
+            house_value,
+            public_risk_reduction,
+        )[:, 0]
+    damage = damage_batch(
+        flood_elevations,
+        house_elevation,
+        building_type,
+        house_value,
+        public_risk_reduction,
+    )
+    return EAD_array(damage, return_period_list)[:, 0]
+
+
+def prospect_utility_options(
+        pi,
+        damage,
+        total_annual_cost,
+        insurance_coverage,
+        expected_utility_parameter=None,
+):
+    # (H, R) weights and (H, E, R) damages -> (H, E, O) prospect utility
+    PU = 0
+    for i in range(damage.shape[-1]):
+        total_damage = (
+                positive(damage[:, :, i, None] - insurance_coverage) + total_annual_cost
+        )
+        PU += pi[:, None, None, i] * U_array(total_damage, expected_utility_parameter)
+    return PU
+
+
+def prospect_utility_batch(
+        flood_elevations,
+        return_period_list,
+        house_elevation,
+        building_type,
+        pi,
+        total_annual_cost,
+        house_value,
+        insurance_coverage,
+        public_risk_reduction,
+):
+    # flood_elevations (H, R) and pi (H, R); house_elevation (H, E);
+    # total_annual_cost and insurance_coverage broadcast to (H, E, O) for O options per elevation.
+    # Returns PU (H, E, O), EAD (H, E) and damage (H, E, R).
+    damage = damage_batch(
+        flood_elevations, house_elevation, building_type, house_value, public_risk_reduction
+    )
+    PU = prospect_utility_options(pi, damage, total_annual_cost, insurance_coverage)
+    EAD = EAD_array(damage, return_period_list)
+    return PU, EAD, damage
+
+
+def coverage_option_table(model):
+    # (I, C) coverage per insurance type, padded with a final 0 slot that is only
+    # offered to households without an insurance requirement
+    coverage_lists = [model.NFIP_coverage_options, model.private_coverage_options]
+    width = max(len(coverage_list) for coverage_list in coverage_lists) + 1
+    dtype = np.asarray([value for coverage_list in coverage_lists for value in coverage_list]).dtype
+    coverage = np.zeros((len(coverage_lists), width), dtype=dtype)
+    offered = np.zeros((len(coverage_lists), width), dtype=bool)
+    for i, coverage_list in enumerate(coverage_lists):
+        coverage[i, : len(coverage_list)] = coverage_list
+        offered[i, : len(coverage_list)] = True
+    return coverage, offered
+
+
+def continuous_coverage(coverage_options, damage):
+    # Any coverage between the smallest and largest option. Between two consecutive
+    # damage levels PU is concave in the coverage when expected_utility_parameter <= 1,
+    # so its minimum is at an interval end or at one of the (H, E, R) damages:
+    # (H, E, R + 2) candidate coverages, ascending.
+    lower = float(np.min(coverage_options))
+    upper = float(np.max(coverage_options))
+    candidates = np.concatenate(
+        [
+            np.full(damage.shape[:2] + (1,), lower),
+            np.clip(damage, lower, upper),
+            np.full(damage.shape[:2] + (1,), upper),
+        ],
+        axis=2,
+    )
+    return np.sort(candidates, axis=2)
+
+
+def option_elevations(model, population):
+    # policy, loan terms and the (H, E) house elevations every household considers
+    policy = "voucher" if model.policy == "voucher" else "pre_FIRM"
+    interest_rate, loan_length = loan_terms[policy]
+    property_height = population["property_height"]
+    if policy == "voucher":
+        estimated_elevation = positive(population["BFE"] - property_height + 1)
+        elevation = estimated_elevation[:, None]
+    else:
+        elevation_options = np.asarray(model.elevation_options)
+        elevation = np.broadcast_to(elevation_options, (len(property_height), len(elevation_options)))
+    return policy, interest_rate, loan_length, elevation
+
+
+def no_action_options(model, population):
+    # (H, 1, R) damages and (H,) EAD without any action
+    flood_elevations = population["flood_elevations"]
+    property_height = population["property_height"]
+    return_period_list = population.get("return_periods", model.return_period_list)
+    damage_no_action = damage_batch(
+        flood_elevations,
+        property_height[:, None],
+        population["building_type"],
+        population["house_value"],
+        population["public_risk_reduction"],
+    )
+    hazard = getattr(model, "hazard", None)
+    if hazard is None:
+        EAD_no_action = EAD_array(damage_no_action, return_period_list)[:, 0]
+    else:
+        # continuous exceedance curve; damage stays at the return periods for PU
+        EAD_no_action = hazard.EAD(
+            flood_elevations,
+            return_period_list,
+            property_height[:, None],
+            population["building_type"],
+            population["house_value"],
+            population["public_risk_reduction"],
+        )[:, 0]
+    return {"damage_no_action": damage_no_action, "EAD_no_action": EAD_no_action}
+
+
+def option_grid(model, population, elevation):
+    # damages, EAD and total annual cost of every option at (H, E) elevations from
+    # option_elevations, or at any subset of them
+    flood_elevations = population["flood_elevations"]
+    property_height = population["property_height"]
+    building_type = population["building_type"]
+    house_value = population["house_value"]
+    public_risk_reduction = population["public_risk_reduction"]
+    n_households, n_elevations = elevation.shape
+    continuous = getattr(model, "continuous_coverage", False)
+    return_period_list = population.get("return_periods", model.return_period_list)
+    policy = "voucher" if model.policy == "voucher" else "pre_FIRM"
+    interest_rate, loan_length = loan_terms[policy]
+
+    damage = damage_batch(
+        flood_elevations,
+        property_height[:, None] + elevation,
+        building_type,
+        house_value,
+        public_risk_reduction,
+    )
+
+    elevation_cost = elevation_cost_array(elevation, population["area"][:, None])
+    annual_elevation_cost = -npf.pmt(interest_rate, loan_length, elevation_cost)
+    NFIP_building_rate, NFIP_contents_rate = functions.insurance_rate_array(
+        "NFIP",
+        population["property_flood_zone"][:, None],
+        property_height[:, None] + elevation - population["BFE"][:, None],
+        model.CRS_rewards,
+        population.get("property_flood_zone_categories"),
+        getattr(model, "zone_rates", None),
+    )
+
+    if policy == "voucher":
+        if continuous:
+            coverage = continuous_coverage(model.NFIP_coverage_options, damage)
+        else:
+            coverage = np.asarray(model.NFIP_coverage_options)[None, None, :]
+        insurance_cost = coverage / 100 * NFIP_building_rate[:, :, None]
+        total_annual_cost = insurance_cost + annual_elevation_cost[:, :, None]
+        # default to the lowest income if not found, see population.from_dataframe
+        income_cap = population["income_value"][:, None, None] / 12 * 0.05
+        total_annual_cost = np.where(total_annual_cost > income_cap, income_cap, total_annual_cost)
+
+        option_type = np.ones((1, 1, coverage.shape[2]), dtype=np.uint8)
+        offered = np.ones(total_annual_cost.shape, dtype=bool)
+
+    else:
+        if continuous:
+            NFIP_coverage = continuous_coverage(model.NFIP_coverage_options, damage)
+            private_coverage = continuous_coverage(model.private_coverage_options, damage)
+            coverage_table = np.stack(
+                [NFIP_coverage, private_coverage], axis=2
+            )
+            coverage_table = np.concatenate(
+                [coverage_table, np.zeros(coverage_table.shape[:3] + (1,))], axis=3
+            )
+            type_offered = np.ones(coverage_table.shape[2:], dtype=bool)
+        else:
+            coverage_table, type_offered = coverage_option_table(model)
+        # private rates are three times the NFIP rates, so the table is searched once
+        building_rate = np.stack([NFIP_building_rate, NFIP_building_rate * 3], axis=-1)
+
+        insurance_cost = coverage_table * building_rate[..., None] / 100
+        total_annual_cost = insurance_cost + annual_elevation_cost[:, :, None, None]
+        total_annual_cost = total_annual_cost.reshape(n_households, n_elevations, -1)
+
+        offered = np.broadcast_to(type_offered, (n_households,) + type_offered.shape).copy()
+        offered[:, :, -1] = ~population["require_insurance"][:, None]
+        offered = np.broadcast_to(
+            offered.reshape(n_households, 1, -1), total_annual_cost.shape
+        )
+        option_type = np.broadcast_to(
+            np.array([1, 2], dtype=np.uint8)[:, None], type_offered.shape
+        ).reshape(1, 1, -1)
+        coverage = coverage_table.reshape(coverage_table.shape[:-2] + (-1,))
+        if coverage.ndim == 1:
+            coverage = coverage[None, None, :]
+
+    hazard = getattr(model, "hazard", None)
+    if hazard is None:
+        EAD = EAD_array(damage, return_period_list)
+    else:
+        EAD = hazard.EAD(
+            flood_elevations,
+            return_period_list,
+            property_height[:, None] + elevation,
+            building_type,
+            house_value,
+            public_risk_reduction,
+        )
+
+    return {
+        "damage": damage,
+        "EAD": EAD,
+        "total_annual_cost": total_annual_cost,
+        # (1, 1, O) for the fixed option lists, (H, E, O) for continuous coverage
+        "insurance_coverage": coverage,
+        "offered": offered,
+        "option_type": option_type,
+    }
+
+
+def decision_options(model, population):
+    # Everything about the options that does not depend on risk perception or the
+    # behavioural parameters: damages, EAD and total annual cost of every option.
+    policy, interest_rate, loan_length, elevation = option_elevations(model, population)
+    options = {"policy": policy, "interest_rate": interest_rate, "loan_length": loan_length}
+    options.update(no_action_options(model, population))
+    options.update(option_grid(model, population, elevation))
+    options["elevation"] = elevation
+    return options
+
+
+def decision_result(options, PU_no_action, chosen, PU, best_elevation, best_option):
+    rows = np.arange(len(chosen))
+    option_shape = options["offered"].shape
+    option_type = np.broadcast_to(options["option_type"], option_shape)
+    option_coverage = np.broadcast_to(options["insurance_coverage"], option_shape)
+    return {
+        "policy": options["policy"],
+        "interest_rate": options["interest_rate"],
+        "loan_length": options["loan_length"],
+        "PU_no_action": PU_no_action[:, 0, 0],
+        "EAD_no_action": options["EAD_no_action"],
+        "damage_no_action": options["damage_no_action"][:, 0, :],
+        "chosen": chosen,
+        "PU": PU,
+        "EAD": options["EAD"][rows, best_elevation],
+        "damage": options["damage"][rows, best_elevation, :],
+        "elevation": options["elevation"][rows, best_elevation],
+        "insurance_type": option_type[rows, best_elevation, best_option],
+        "insurance_coverage": option_coverage[rows, best_elevation, best_option],
+    }
+
+
+def choose_options(options, pi, current_PU, expected_utility_parameter=None):
+    PU_no_action = prospect_utility_options(
+        pi, options["damage_no_action"], 0, 0, expected_utility_parameter
+    )
+    PU = prospect_utility_options(
+        pi,
+        options["damage"],
+        options["total_annual_cost"],
+        options["insurance_coverage"],
+        expected_utility_parameter,
+    )
+
+    # first option (elevation, then type, then coverage) with the lowest PU wins,
+    # and only if it improves on the household's current PU
+    n_households = len(PU)
+    PU = np.where(options["offered"] & ~np.isnan(PU), PU, np.inf)
+    n_options = PU.shape[1] * PU.shape[2]
+    best = np.argmin(PU.reshape(n_households, n_options), axis=1)
+    best_elevation, best_option = np.divmod(best, PU.shape[2])
+    best_PU = PU[np.arange(n_households), best_elevation, best_option]
+    chosen = best_PU < current_PU
+
+    decisions = decision_result(
+        options,
+        PU_no_action,
+        chosen,
+        np.where(chosen, best_PU, current_PU),
+        best_elevation,
+        best_option,
+    )
+    decisions["evaluated_options"] = options["offered"].sum(axis=(1, 2))
+    decisions["pruned_options"] = np.zeros(n_households, dtype=int)
+    return decisions
+
+
+def dominated_options(options):
+    # Within one elevation, option j dominates option i when it costs no more and leaves
+    # no more residual damage in any return period, i.e. its coverage capped at the
+    # largest damage is at least as high. Options are swept by (cost, -capped coverage,
+    # option order), so every option is compared with the best coverage seen so far and
+    # the first of several identical options is kept.
+    offered = options["offered"]
+    cost = np.where(offered, options["total_annual_cost"], np.inf)
+    capped_coverage = np.minimum(
+        np.broadcast_to(options["insurance_coverage"], offered.shape),
+        options["damage"].max(axis=2)[:, :, None],
+    )
+    option_order = np.broadcast_to(np.arange(offered.shape[2]), offered.shape)
+    order = np.lexsort((option_order, -capped_coverage, cost), axis=-1)
+    sorted_coverage = np.take_along_axis(capped_coverage, order, axis=-1)
+    best_before = np.maximum.accumulate(sorted_coverage, axis=-1)
+    dominated_sorted = np.zeros(offered.shape, dtype=bool)
+    dominated_sorted[:, :, 1:] = best_before[:, :, :-1] >= sorted_coverage[:, :, 1:]
+    dominated = np.empty(offered.shape, dtype=bool)
+    np.put_along_axis(dominated, order, dominated_sorted, axis=-1)
+    return dominated & offered, cost, capped_coverage
+
+
+# per-household inputs of option_grid, see household_subset
+option_inputs = [
+    "flood_elevations",
+    "property_height",
+    "building_type",
+    "house_value",
+    "public_risk_reduction",
+    "BFE",
+    "area",
+    "property_flood_zone",
+    "income_value",
+    "require_insurance",
+    "return_periods",
+]
+
+
+def household_subset(population, households):
+    subset = {name: population[name][households] for name in option_inputs if name in population}
+    if "property_flood_zone_categories" in population:
+        subset["property_flood_zone_categories"] = population["property_flood_zone_categories"]
+    return subset
+
+
+def pruned_choose_options(model, population, pi, current_PU, expected_utility_parameter=None):
+    # Same choice as choose_options (up to exact floating-point ties between different
+    # options), evaluating far fewer options and without the (H, E, R) damage and
+    # (H, E, O) cost tensors of decision_options. Every option at an elevation costs at
+    # least its annual elevation cost and leaves no negative residual damage, so the
+    # elevations are visited from that bound up. A visit computes the damages and costs
+    # of that elevation only, drops dominated options, and skips the elevation when the
+    # bound from its damages, lowest cost and highest coverage cannot beat the best PU
+    # found so far.
+    policy, interest_rate, loan_length, elevation = option_elevations(model, population)
+    n_households, n_elevations = elevation.shape
+    no_action = no_action_options(model, population)
+    PU_no_action = prospect_utility_options(
+        pi, no_action["damage_no_action"], 0, 0, expected_utility_parameter
+    )
+
+    elevation_cost = elevation_cost_array(elevation, population["area"][:, None])
+    annual_elevation_cost = -npf.pmt(interest_rate, loan_length, elevation_cost)
+    if policy == "voucher":
+        # the total annual cost is capped at the income share
+        annual_elevation_cost = np.minimum(
+            annual_elevation_cost, population["income_value"][:, None] / 12 * 0.05
+        )
+    # summed the same way as the PU of an option, so that it never exceeds it
+    cost_bound = prospect_utility_options(
+        pi,
+        np.zeros((n_households, 1, pi.shape[1])),
+        annual_elevation_cost[:, :, None],
+        0,
+        expected_utility_parameter,
+    )[:, :, 0]
+    visit_order = np.argsort(cost_bound, axis=1, kind="stable")
+
+    rows = np.arange(n_households)
+    best_PU = np.asarray(current_PU, dtype=float).copy()
+    best_index = np.full(n_households, -1)
+    best_EAD = no_action["EAD_no_action"].copy()
+    best_damage = no_action["damage_no_action"][:, 0, :].copy()
+    best_elevation = np.array(elevation[:, 0], dtype=float)
+    best_type = np.zeros(n_households, dtype=np.uint8)
+    best_coverage = np.zeros(n_households)
+    evaluated = np.zeros(n_households, dtype=int)
+    n_offered = np.zeros(n_households, dtype=int)
+    n_options = 0
+    # one NFIP lookup per visited household and elevation, as in option_grid
+    rate_lookups = 0
+
+    for k in range(n_elevations):
+        elevation_index = visit_order[:, k]
+        bound = cost_bound[rows, elevation_index]
+        # ties go to the earlier option, as in choose_options
+        active = (bound < best_PU) | (
+                (bound == best_PU)
+                & (best_index >= 0)
+                & (elevation_index * n_options < best_index)
+        )
+        # the first visit covers every household, for the number of offered options
+        households = rows if k == 0 else np.flatnonzero(active)
+        if not len(households):
+            break
+        grid = option_grid(
+            model,
+            household_subset(population, households),
+            elevation[households, elevation_index[households]][:, None],
+        )
+        rate_lookups += len(households)
+        if k == 0:
+            n_options = grid["offered"].shape[2]
+            n_offered = grid["offered"].sum(axis=(1, 2)) * n_elevations
+
+        dominated, cost, capped_coverage = dominated_options(grid)
+        candidates = grid["offered"] & ~dominated & active[households, None, None]
+        lowest_cost = np.where(candidates, cost, np.inf).min(axis=2)
+        highest_coverage = np.where(candidates, capped_coverage, -np.inf).max(axis=2)
+        lower_bound = prospect_utility_options(
+            pi[households],
+            grid["damage"],
+            np.where(np.isfinite(lowest_cost), lowest_cost, 0)[:, :, None],
+            np.where(np.isfinite(highest_coverage), highest_coverage, 0)[:, :, None],
+            expected_utility_parameter,
+        )[:, 0, 0]
+        lower_bound = np.where(candidates.any(axis=(1, 2)), lower_bound, np.inf)
+        index_start = elevation_index[households] * n_options
+        visit = (lower_bound < best_PU[households]) | (
+                (lower_bound == best_PU[households])
+                & (best_index[households] >= 0)
+                & (index_start < best_index[households])
+        )
+
+        option_rows, _, options_index = np.nonzero(candidates & visit[:, None, None])
+        if not len(option_rows):
+            continue
+        option_households = households[option_rows]
+        evaluated += np.bincount(option_households, minlength=n_households)
+        coverage = np.broadcast_to(grid["insurance_coverage"], cost.shape)[option_rows, 0, options_index]
+        PU = prospect_utility_options(
+            pi[option_households],
+            grid["damage"][option_rows],
+            cost[option_rows, 0, options_index][:, None, None],
+            coverage[:, None, None],
+            expected_utility_parameter,
+        )[:, 0, 0]
+        PU = np.where(np.isnan(PU), np.inf, PU)
+        index = index_start[option_rows] + options_index
+
+        # best option of every household at this elevation, then against the incumbent
+        first = np.lexsort((index, PU, option_households))
+        keep = np.ones(len(first), dtype=bool)
+        keep[1:] = option_households[first][1:] != option_households[first][:-1]
+        first = first[keep]
+        candidate_households = option_households[first]
+        better = (PU[first] < best_PU[candidate_households]) | (
+                (PU[first] == best_PU[candidate_households])
+                & (best_index[candidate_households] >= 0)
+                & (index[first] < best_index[candidate_households])
+        )
+        winners = first[better]
+        winner_households = option_households[winners]
+        winner_rows = option_rows[winners]
+        best_PU[winner_households] = PU[winners]
+        best_index[winner_households] = index[winners]
+        best_EAD[winner_households] = grid["EAD"][winner_rows, 0]
+        best_damage[winner_households] = grid["damage"][winner_rows, 0, :]
+        best_elevation[winner_households] = elevation[winner_households, elevation_index[winner_households]]
+        best_type[winner_households] = np.broadcast_to(grid["option_type"], cost.shape)[
+            winner_rows, 0, options_index[winners]
+        ]
+        best_coverage[winner_households] = coverage[winners]
+
+    return {
+        "policy": policy,
+        "interest_rate": interest_rate,
+        "loan_length": loan_length,
+        "PU_no_action": PU_no_action[:, 0, 0],
+        "EAD_no_action": no_action["EAD_no_action"],
+        "damage_no_action": no_action["damage_no_action"][:, 0, :],
+        "chosen": best_index >= 0,
+        "PU": best_PU,
+        "EAD": best_EAD,
+        "damage": best_damage,
+        "elevation": best_elevation,
+        "insurance_type": best_type,
+        "insurance_coverage": best_coverage,
+        "evaluated_options": evaluated,
+        "pruned_options": n_offered - evaluated,
+        "rate_lookups": rate_lookups,
+    }
+
+
+def household_decisions(model, population):
+    profiler = getattr(model, "profiler", instrumentation.disabled)
+    pruned = getattr(model, "option_search", "exhaustive") == "pruned"
+    if not pruned:
+        with profiler.stage("decision_options"):
+            options = decision_options(model, population)
+        # one NFIP lookup per household and elevation, private rates reuse it
+        profiler.count("rate_lookups", options["elevation"].size)
+
+    if "pi" in population:
+        # weights cached on the population store, see household_population.probability_weights
+        risk_perception, pi = population["risk_perception"], population["pi"]
+    else:
+        with profiler.stage("probability_weights"):
+            risk_perception, pi = probability_weights(
+                population,
+                population.get("return_periods", model.return_period_list),
+                getattr(model, "pi_table", None),
+            )
+
+    with profiler.stage("choose_options"):
+        if pruned:
+            # damages and costs are built only for the elevations each household visits
+            decisions = pruned_choose_options(model, population, pi, population["PU"])
+            profiler.count("rate_lookups", decisions["rate_lookups"])
+        else:
+            decisions = choose_options(options, pi, population["PU"])
+    decisions["risk_perception"] = risk_perception
+
+    n_households = len(risk_perception)
+    evaluated = int(decisions["evaluated_options"].sum())
+    profiler.count("households_decided", n_households)
+    # the no-action utility plus every evaluated option
+    profiler.count("prospect_utility_evaluations", evaluated + n_households)
+    profiler.count("options_evaluated", evaluated)
+    profiler.count("options_pruned", decisions["pruned_options"].sum())
+    return decisions